@@ -34,7 +34,7 @@ class UserCreate(graphene.Mutation):
         """
         with transaction.atomic():
             user = User.objects.create_user(username=username, email=email, password=password)
-            matter_admin = MattermostAdminProxy()
+            matter_admin = MattermostAdminProxy.shared()
             creation_status = matter_admin.create_user(user_data={"username": user.username, "email": user.email, "password": user.password[:30]})
             add_to_team_status = matter_admin.add_user_to_team(user_identifier=user.username)
             if not (creation_status and add_to_team_status):
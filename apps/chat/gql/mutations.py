@@ -1,17 +1,31 @@
+import asyncio
 import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 
 import graphene
 from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.core.handlers.wsgi import WSGIRequest
 from graphql_jwt.decorators import login_required
 
 from apps.chat.gql.subscriptions import OnNewChatMessage
 from helpers import http_code
 from helpers.generic_types import ResponseBase
 from helpers.mattermostproxydriver.admin import MattermostAdminProxy
+from helpers.mattermostproxydriver.async_user import AsyncMattermostUserProxy
 from helpers.mattermostproxydriver.user import MattermostUserProxy
 
+logger = logging.getLogger(__name__)
+
 
 class ChannelCreate(graphene.Mutation):
     """
@@ -44,7 +58,7 @@ class ChannelCreate(graphene.Mutation):
         if None in member_users:
             raise Exception("Members are not valid.")
 
-        matter_admin = MattermostAdminProxy()
+        matter_admin = MattermostAdminProxy.shared()
         channel_id = matter_admin.create_join_channel(channel_name=channel_name)
         for us in member_users + [user]:
             matter_admin.add_user_to_channel(channel_identifier=channel_name, user_identifier=us.username)
@@ -73,26 +87,189 @@ class TextMessageSend(graphene.Mutation):
     class Arguments:
         channel_identifier = graphene.Argument(graphene.String, required=True, description="Identifier of the channel to send the message to.")
         text_message = graphene.Argument(graphene.String, required=True, description="Text message to be sent.")
+        client_message_id = graphene.Argument(
+            graphene.String, required=False, description="Client generated ID of the message, echoed in its provisional copy and in the confirmation."
+        )
 
     Output = ResponseBase
 
+    # Threads notifying the subscribers of messages sent over HTTP, so the response does not wait for the broadcast.
+    broadcast_executor = ThreadPoolExecutor(max_workers=settings.CHAT_MESSAGE_BROADCAST["executor_max_workers"], thread_name_prefix="chat-broadcast")
+
+    # Broadcasts of messages sent over WebSocket still running on the event loop.
+    _broadcast_tasks = set()
+
+    # The last broadcast started for each channel, each broadcast waits for the previous one of its channel,
+    # so the subscribers get the messages of a channel in the order they were sent.
+    _last_broadcasts = {}  # {channel_id: future, ...} for the executor, {(event_loop, channel_id): task, ...} on event loops.
+    _last_broadcasts_lock = threading.Lock()
+
+    # Custom property of the posts made by the mutation, which notifies the subscribers itself, so the
+    # `ingest_mattermost_events` command does not broadcast them a second time.
+    broadcast_post_prop = "mattermostsub_broadcast"
+
+    # Prefix of the IDs of the provisional copies of the messages, Mattermost IDs are alphanumeric.
+    provisional_id_prefix = "pending-"
+
     @login_required
-    def mutate(self, info, channel_identifier, text_message):
+    def mutate(self, info, channel_identifier, text_message, client_message_id=None):
         """
         Sends a text message to a specified channel.
+        The response is returned as soon as Mattermost acknowledges the message, the channel members are notified in the background,
+        whether they subscribed with the ID or with the name of the channel.
+
+        In the optimistic mode (see the CHAT_MESSAGE_BROADCAST settings) a provisional copy of the message is broadcast with the
+        "pending" status before it is posted to Mattermost, followed by the posted message with the "sent" status, or by the
+        provisional copy with the "failed" status. Both carry the client message ID, so clients replace the provisional copy.
 
         Args:
             info (ResolveInfo): Information about the mutation.
             channel_identifier (str): Identifier of the channel.
             text_message (str): The text message to be sent.
+            client_message_id (str): Client generated ID of the message, generated when not given in the optimistic mode.
 
         Returns:
             ResponseBase: The result of the message sending operation.
         """
         user = info.context.user
-        matter_user = MattermostUserProxy(login_id=user.username, password=user.password[:30])
-        response = matter_user.send_message(channel_identifier=channel_identifier, message=text_message)
+        if client_message_id is None and settings.CHAT_MESSAGE_BROADCAST["optimistic_echo"]:
+            client_message_id = uuid.uuid4().hex
+
+        if not (isinstance(info.context, WSGIRequest) or isinstance(info.context, ASGIRequest)):
+            # Over WebSocket the mutation runs on the event loop, so the Mattermost call is awaited instead.
+            return TextMessageSend._mutate_async(user, channel_identifier, text_message, client_message_id)
+
+        # The channel is resolved among the channels of the user first, so nothing is broadcast to a channel the user is not a member of.
+        matter_user = MattermostUserProxy.from_user(user)
+        team_id = TextMessageSend._check_team_id(matter_user._find_team_id(settings.MATTERMOST_SERVER["team_identifier"]))
+        channel_identifiers = TextMessageSend._channel_identifiers(matter_user._find_channel(team_id, channel_identifier))
+
+        provisional_message = None
+        if settings.CHAT_MESSAGE_BROADCAST["optimistic_echo"]:
+            provisional_message = TextMessageSend._provisional_message(user, text_message, client_message_id)
+            TextMessageSend._start_broadcast_in_executor(channel_identifiers, provisional_message)
+
+        try:
+            response = matter_user.send_message(channel_identifier=channel_identifiers[0], message=text_message, props={TextMessageSend.broadcast_post_prop: True})
+        except Exception:
+            if provisional_message is not None:
+                TextMessageSend._start_broadcast_in_executor(channel_identifiers, {**provisional_message, "status": "failed"})
+            raise
+
+        formatted_response = TextMessageSend._format_message(response, client_message_id, confirmed=provisional_message is not None)
+        TextMessageSend._start_broadcast_in_executor(channel_identifiers, formatted_response)
 
+        return TextMessageSend._make_response(formatted_response)
+
+    @staticmethod
+    async def _mutate_async(user, channel_identifier, text_message, client_message_id):
+        """
+        Asynchronous counterpart of mutate, used when the mutation is executed on the event loop.
+        """
+        # The channel is resolved among the channels of the user first, so nothing is broadcast to a channel the user is not a member of.
+        matter_user = await AsyncMattermostUserProxy.from_user(user)
+        team_id = TextMessageSend._check_team_id(await matter_user._find_team_id(settings.MATTERMOST_SERVER["team_identifier"]))
+        channel_identifiers = TextMessageSend._channel_identifiers(await matter_user._find_channel(team_id, channel_identifier))
+
+        provisional_message = None
+        if settings.CHAT_MESSAGE_BROADCAST["optimistic_echo"]:
+            provisional_message = TextMessageSend._provisional_message(user, text_message, client_message_id)
+            TextMessageSend._start_broadcast_task(channel_identifiers, provisional_message)
+
+        try:
+            response = await matter_user.send_message(channel_identifier=channel_identifiers[0], message=text_message, props={TextMessageSend.broadcast_post_prop: True})
+        except Exception:
+            if provisional_message is not None:
+                TextMessageSend._start_broadcast_task(channel_identifiers, {**provisional_message, "status": "failed"})
+            raise
+
+        formatted_response = TextMessageSend._format_message(response, client_message_id, confirmed=provisional_message is not None)
+        TextMessageSend._start_broadcast_task(channel_identifiers, formatted_response)
+
+        return TextMessageSend._make_response(formatted_response)
+
+    @staticmethod
+    def _start_broadcast_in_executor(channel_identifiers, message):
+        """
+        Starts the broadcast of the message to the channel identifiers (ID first) in the broadcast executor, after the previous
+        broadcast of the channel, returns its future.
+        """
+        # NOTE: The executor starts the broadcasts in submission order, so a broadcast waiting for
+        # the previous one never holds the last free thread the previous one needs.
+        with TextMessageSend._last_broadcasts_lock:
+            after = TextMessageSend._last_broadcasts.get(channel_identifiers[0])
+            future = TextMessageSend.broadcast_executor.submit(async_to_sync(TextMessageSend._broadcast), channel_identifiers, message, after=after)
+            TextMessageSend._last_broadcasts[channel_identifiers[0]] = future
+        future.add_done_callback(lambda future: TextMessageSend._forget_broadcast(channel_identifiers[0], future))
+        future.add_done_callback(TextMessageSend._log_broadcast_failure)
+        return future
+
+    @staticmethod
+    def _start_broadcast_task(channel_identifiers, message):
+        """
+        Starts the broadcast of the message to the channel identifiers (ID first) as a task on the running event loop, after the
+        previous broadcast of the channel, returns the task.
+        """
+        key = (asyncio.get_running_loop(), channel_identifiers[0])
+        with TextMessageSend._last_broadcasts_lock:
+            task = asyncio.create_task(TextMessageSend._broadcast(channel_identifiers, message, after=TextMessageSend._last_broadcasts.get(key)))
+            TextMessageSend._last_broadcasts[key] = task
+        TextMessageSend._broadcast_tasks.add(task)
+        task.add_done_callback(TextMessageSend._broadcast_tasks.discard)
+        task.add_done_callback(lambda task: TextMessageSend._forget_broadcast(key, task))
+        task.add_done_callback(TextMessageSend._log_broadcast_failure)
+        return task
+
+    @staticmethod
+    def _forget_broadcast(key, future):
+        """
+        Forgets the finished broadcast unless a later broadcast of the channel has already replaced it.
+        """
+        with TextMessageSend._last_broadcasts_lock:
+            if TextMessageSend._last_broadcasts.get(key) is future:
+                del TextMessageSend._last_broadcasts[key]
+
+    @staticmethod
+    def _check_team_id(team_id):
+        """
+        Returns the team ID found among the teams of the user, raises when it was not found.
+        """
+        if team_id is None:
+            raise Exception("Team identifier not found.")
+        return team_id
+
+    @staticmethod
+    def _channel_identifiers(channel):
+        """
+        Returns the ID and the name of the channel found among the channels of the user, raises when it was not found.
+        Clients subscribe with either, so the messages are broadcast to both.
+        """
+        if channel is None:
+            raise Exception("Channel identifier not found.")
+        return tuple(dict.fromkeys(channel_identifier for channel_identifier in (channel["id"], channel.get("name")) if channel_identifier))
+
+    @staticmethod
+    def _provisional_message(user, text_message, client_message_id):
+        """
+        Makes the provisional copy of the message broadcast before it is posted, the Mattermost username is the Django one.
+        Its ID is prefixed so it never matches the ID of a posted message.
+        """
+        return {
+            "id": f"{TextMessageSend.provisional_id_prefix}{client_message_id}",
+            "message": text_message,
+            "create_at": MattermostUserProxy.convert_timestamp_to_iso(time.time() * 1000, settings.TIME_ZONE),
+            "username": user.username,
+            "type": "str",
+            "client_message_id": client_message_id,
+            "status": "pending",
+        }
+
+    @staticmethod
+    def _format_message(response, client_message_id=None, confirmed=False):
+        """
+        Formats the message returned by the Mattermost server for the subscribers.
+        The confirmation of a provisional message has the "sent" status.
+        """
         formatted_response = {
             "id": response.get("id", None),
             "message": response.get("message", None),
@@ -100,28 +277,70 @@ class TextMessageSend(graphene.Mutation):
             "username": response.get("username", None),
             "type": response.get("type", None),
         }
+        if client_message_id is not None:
+            formatted_response["client_message_id"] = client_message_id
+        if confirmed:
+            formatted_response["status"] = "sent"
+        return formatted_response
 
-        async_to_sync(OnNewChatMessage.new_chat_message)(channel_identifier=channel_identifier, message=formatted_response)
+    @staticmethod
+    async def _broadcast(channel_identifiers, formatted_response, after=None):
+        """
+        Notifies the channel members subscribed with any of the channel identifiers of the new message through the OnNewChatMessage subscription.
+        The legacy raw `chat_message` events are sent concurrently when enabled in the settings, for posted messages only.
+        When `after` (a task or a future of the previous broadcast of the channel) is given, waits for it first to keep the notifications ordered.
+        """
+        if after is not None:
+            await asyncio.wait([asyncio.wrap_future(after) if isinstance(after, Future) else after])
 
-        channel_layer = get_channel_layer()
+        notification = OnNewChatMessage.new_chat_messages((channel_identifier, formatted_response) for channel_identifier in channel_identifiers)
+        if not settings.CHAT_MESSAGE_BROADCAST["legacy_chat_message_event"] or formatted_response.get("status", "sent") != "sent":
+            await notification
+            return
 
-        async_to_sync(channel_layer.group_add)(
-            channel_identifier,
-            channel_identifier,
+        await asyncio.gather(
+            notification,
+            *(TextMessageSend._send_legacy_chat_message_event(channel_identifier, formatted_response) for channel_identifier in channel_identifiers),
         )
 
-        # Prepare the message
+    @staticmethod
+    async def _send_legacy_chat_message_event(channel_identifier, formatted_response):
+        """
+        Sends the raw `chat_message` event for clients reading the channel layer channel named after the chat channel.
+        The event used to go through a group the channel was added to on every message; it is sent to the channel
+        directly instead, which delivers it to the same readers without touching the group.
+
+        Like `group_send` did, the event is dropped when the channel is full, which is the case of the channels nobody
+        reads as soon as `capacity` events are sent to them within `expiry` seconds.
+        """
         message = {"type": "chat_message", "message": json.dumps({"channel_identifier": channel_identifier, "message": formatted_response})}
+        try:
+            await get_channel_layer().send(channel_identifier, message)
+        except ChannelFull:
+            logger.debug("Legacy chat_message event to the full channel %s dropped.", channel_identifier)
 
-        # Broadcast the message to the group
-        async_to_sync(channel_layer.group_send)(channel_identifier, message)
+    @staticmethod
+    def _log_broadcast_failure(future):
+        """
+        Logs the failure of a background broadcast, which has no caller to raise to.
+        """
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Broadcast of a new chat message failed.", exc_info=future.exception())
 
+    @staticmethod
+    def _make_response(formatted_response):
+        """
+        Makes the mutation response for the sent message.
+        """
         if formatted_response.get("id", None):
+            metadata = {"message_id": formatted_response["id"]}
+            if "client_message_id" in formatted_response:
+                metadata["client_message_id"] = formatted_response["client_message_id"]
             return ResponseBase(
                 status=http_code.HTTP_200_OK,
                 status_code=http_code.HTTP_200_OK_CODE,
                 message="Message send successfully!",
-                metadata={"message_id": formatted_response["id"]},
+                metadata=metadata,
             )
         else:
             return ResponseBase(
@@ -1,9 +1,12 @@
 import graphene
+from django.core.handlers.asgi import ASGIRequest
+from django.core.handlers.wsgi import WSGIRequest
 from graphql_jwt.decorators import login_required
 
 from apps.chat.gql.types import ChannelListType
 from apps.chat.gql.types import MessageListType
 from helpers.generic_types import PageType
+from helpers.mattermostproxydriver.async_user import AsyncMattermostUserProxy
 from helpers.mattermostproxydriver.user import MattermostUserProxy
 
 
@@ -35,13 +38,27 @@ class ChannelList(graphene.ObjectType):
         user = info.context.user
         page = kwargs.get("page", {"page_size": 10, "page_number": 0})
 
-        matter_user = MattermostUserProxy(login_id=user.username, password=user.password[:30])
+        if not (isinstance(info.context, WSGIRequest) or isinstance(info.context, ASGIRequest)):
+            # Over WebSocket the query runs on the event loop, so the Mattermost calls are awaited instead.
+            return ChannelList._resolve_channel_list_async(user, page)
+
+        matter_user = MattermostUserProxy.from_user(user)
         data, has_next = matter_user.list_related_channels(exclude_list=[], params={"page": page["page_number"], "per_page": page["page_size"]})
 
         channel_list = ChannelListType(data=data, has_next=has_next)
 
         return channel_list
 
+    @staticmethod
+    async def _resolve_channel_list_async(user, page):
+        """
+        Asynchronous counterpart of resolve_channel_list, used when the query is executed on the event loop.
+        """
+        matter_user = await AsyncMattermostUserProxy.from_user(user)
+        data, has_next = await matter_user.list_related_channels(exclude_list=[], params={"page": page["page_number"], "per_page": page["page_size"]})
+
+        return ChannelListType(data=data, has_next=has_next)
+
 
 class GetMessageList(graphene.ObjectType):
     """
@@ -73,10 +90,27 @@ class GetMessageList(graphene.ObjectType):
         page = kwargs.get("page", {"page_size": 10, "page_number": 0})
         channel_identifier = kwargs.get("channel_identifier", None)
 
-        matter_user = MattermostUserProxy(login_id=user.username, password=user.password[:30])
+        if not (isinstance(info.context, WSGIRequest) or isinstance(info.context, ASGIRequest)):
+            # Over WebSocket the query runs on the event loop, so the Mattermost calls are awaited instead.
+            return GetMessageList._resolve_get_message_list_async(user, page, channel_identifier)
+
+        matter_user = MattermostUserProxy.from_user(user)
         data, has_prev, has_next = matter_user.get_messages(channel_identifier=channel_identifier, params={"page": page["page_number"], "per_page": page["page_size"]})
         sorted_data = sorted(data, key=lambda x: x["create_at"])
 
         message_list = MessageListType(data=sorted_data, has_previous=has_prev, has_next=has_next)
 
         return message_list
+
+    @staticmethod
+    async def _resolve_get_message_list_async(user, page, channel_identifier):
+        """
+        Asynchronous counterpart of resolve_get_message_list, used when the query is executed on the event loop.
+        """
+        matter_user = await AsyncMattermostUserProxy.from_user(user)
+        data, has_prev, has_next = await matter_user.get_messages(
+            channel_identifier=channel_identifier, params={"page": page["page_number"], "per_page": page["page_size"]}
+        )
+        sorted_data = sorted(data, key=lambda x: x["create_at"])
+
+        return MessageListType(data=sorted_data, has_previous=has_prev, has_next=has_next)
@@ -10,6 +10,9 @@ class OnNewChatMessage(subscription.Subscription):
     This subscription allows clients to listen for new messages on a specified channel.
     """
 
+    # The notification depends on the channel and the message only, so subscribers of the same channel share it.
+    share_notification_results = True
+
     channel_identifier = graphene.String()
     message = graphene.Field(MessageQueryType)
 
@@ -76,3 +79,13 @@ class OnNewChatMessage(subscription.Subscription):
             group=channel_identifier,
             payload={"channel_identifier": channel_identifier, "message": message},
         )
+
+    @classmethod
+    async def new_chat_messages(cls, messages):
+        """
+        Auxiliary function to send many subscription notifications at once, e.g. when replaying or importing a backlog.
+
+        Args:
+            messages (iterable): Pairs of the channel identifier and the message (dict) sent to the channel, in the order of sending.
+        """
+        await cls.broadcast_many((channel_identifier, {"channel_identifier": channel_identifier, "message": message}) for channel_identifier, message in messages)
@@ -46,6 +46,18 @@ class MessageQueryType(graphene.ObjectType):
         """Resolve the type of the message."""
         return root["type"]
 
+    client_message_id = graphene.String(description="Client generated ID of the message, if the sender gave one.")
+
+    def resolve_client_message_id(root, info):
+        """Resolve the client generated ID of the message."""
+        return root.get("client_message_id")
+
+    status = graphene.String(description="Delivery status of the message: 'pending' for a provisional copy, 'sent' or 'failed'.")
+
+    def resolve_status(root, info):
+        """Resolve the delivery status of the message."""
+        return root.get("status", "sent")
+
 
 class MessageListType(graphene.ObjectType):
     """
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.chat.gql.mutations import TextMessageSend
+from apps.chat.gql.subscriptions import OnNewChatMessage
+from helpers.mattermostproxydriver.async_pool import AsyncMattermostClient
+from helpers.mattermostproxydriver.async_user import AsyncMattermostUserProxy
+from helpers.mattermostproxydriver.events import MattermostEventStream
+from helpers.mattermostproxydriver.message_cache import recent_message_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Management command streaming the Mattermost events to the GraphQL subscribers.
+
+    A single connection to the Mattermost WebSocket API, authenticated as the admin account, broadcasts the
+    messages posted from anywhere (the Mattermost UI, bots, integrations) through the OnNewChatMessage
+    subscription, to the subscribers of both the ID and the name of their channel. The account only receives
+    the events of the channels it belongs to. Messages sent with the `textMessageSend` mutation are skipped,
+    the mutation notifies the subscribers of both identifiers itself.
+
+    The ingestion also keeps the recent message cache (see CHAT_MESSAGE_CACHE) up to date: posted messages are
+    added to it, edits and deletions invalidate their channel and events missed by the stream clear it.
+
+    Methods:
+        handle: Runs the ingestion until interrupted.
+        login: Logs the client in, retrying until it succeeds.
+        ingest: Dispatches the events of the stream of the given proxy to the event handlers.
+        on_posted: Broadcasts a posted message to the subscribers of its channel.
+        on_post_changed: Invalidates the cached messages of the channel of an edited or deleted message.
+    """
+
+    help = "Streams the Mattermost events and notifies the OnNewChatMessage subscribers of the posted messages."
+
+    def handle(self, *args, **options):
+        """
+        Runs the ingestion until interrupted.
+        """
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            pass
+
+    async def _run(self):
+        """
+        Logs the admin account in and ingests its events, closing the client when stopped.
+        """
+        client = AsyncMattermostClient(
+            login_id=settings.MATTERMOST_SERVER["admin_login_id"],
+            password=settings.MATTERMOST_SERVER["admin_password"],
+            base_url=settings.MATTERMOST_SERVER["server_URL"],
+        )
+        try:
+            await self.login(client)
+            await self.ingest(AsyncMattermostUserProxy(client))
+        finally:
+            await client.close()
+
+    async def login(self, client, reconnect_delay=settings.MATTERMOST_EVENTS["reconnect_delay"], max_reconnect_delay=settings.MATTERMOST_EVENTS["max_reconnect_delay"]):
+        """
+        Logs the client in, retrying with the backoff of the event stream reconnections until it succeeds,
+        so the worker can be started before the Mattermost server.
+        """
+        delay = reconnect_delay
+        while True:
+            try:
+                return await client.login()
+            except Exception as e:
+                logger.warning("Login to the Mattermost server failed: %s.", e)
+            logger.info("Logging in to the Mattermost server again in %s seconds.", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+    async def ingest(self, proxy, stream=None):
+        """
+        Dispatches the events of the stream of the given proxy to the event handlers, until the stream is closed.
+        A failing handler is logged and does not stop the ingestion.
+        """
+        stream = stream or MattermostEventStream(proxy.client)
+        event_handlers = {"posted": self.on_posted, "post_edited": self.on_post_changed, "post_deleted": self.on_post_changed}
+        missed_event_gaps = stream.missed_event_gaps
+        try:
+            async for event in stream:
+                if stream.missed_event_gaps != missed_event_gaps and recent_message_cache is not None:
+                    # Messages of any channel may have been posted, edited or deleted in the gap.
+                    await recent_message_cache.aclear()
+                missed_event_gaps = stream.missed_event_gaps
+
+                handler = event_handlers.get(event["event"])
+                if handler is None:
+                    continue
+                try:
+                    await handler(proxy, event)
+                except Exception:
+                    logger.exception("Handling of the Mattermost event %s failed.", event.get("seq"))
+        finally:
+            await stream.close()
+
+    async def on_posted(self, proxy, event):
+        """
+        Broadcasts a posted message to the subscribers of its channel, formatted like the messages sent with the mutation.
+        """
+        post = json.loads(event["data"]["post"])
+        if (post.get("props") or {}).get(TextMessageSend.broadcast_post_prop):
+            return
+
+        formatted_post = (await proxy._format_posts([post]))[0]
+        if recent_message_cache is not None:
+            await recent_message_cache.aadd(post["channel_id"], formatted_post)
+        message = TextMessageSend._format_message(formatted_post)
+
+        # Clients subscribe with either the ID or the name of the channel.
+        channel_identifiers = [post["channel_id"]]
+        if event["data"].get("channel_name") and event["data"]["channel_name"] != post["channel_id"]:
+            channel_identifiers.append(event["data"]["channel_name"])
+
+        await OnNewChatMessage.new_chat_messages((channel_identifier, message) for channel_identifier in channel_identifiers)
+
+    async def on_post_changed(self, proxy, event):
+        """
+        Invalidates the cached messages of the channel of an edited or deleted message.
+        """
+        if recent_message_cache is not None:
+            await recent_message_cache.ainvalidate(json.loads(event["data"]["post"])["channel_id"])
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+from aiohttp import web
+from django.test import SimpleTestCase
+
+from apps.chat.management.commands.ingest_mattermost_events import Command
+from helpers.mattermostproxydriver.async_pool import AsyncMattermostClient
+from helpers.mattermostproxydriver.events import MattermostEventStream
+
+
+class FakeMattermostServer:
+    """
+    A local Mattermost server answering the login and streaming scripted WebSocket frames.
+
+    Args:
+        connections (list): The frames sent on each successive WebSocket connection, the connection is closed after them.
+        failed_logins (int): Number of login attempts answered with an error before the first successful one.
+
+    Methods:
+        start: Starts the server and returns a client of it.
+        stop: Stops the server.
+    """
+
+    def __init__(self, connections, failed_logins=0):
+        self.connections = list(connections)
+        self.failed_logins = failed_logins
+        self.logins = 0
+        self.queries = []  # The query of each WebSocket connection.
+        self._runner = None
+
+    async def start(self):
+        """
+        Starts the server and returns a client of it.
+        """
+        app = web.Application()
+        app.add_routes([web.post("/api/v4/users/login", self._login), web.get("/api/v4/websocket", self._websocket)])
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return AsyncMattermostClient(login_id="admin", password="password", base_url="127.0.0.1", scheme="http", port=port)
+
+    async def stop(self):
+        """
+        Stops the server.
+        """
+        await self._runner.cleanup()
+
+    async def _login(self, request):
+        self.logins += 1
+        if self.logins <= self.failed_logins:
+            return web.json_response({"message": "Unavailable"}, status=503)
+        return web.json_response({"id": "admin_id", "username": "admin"}, headers={"Token": "token"})
+
+    async def _websocket(self, request):
+        self.queries.append(dict(request.query))
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        if self.connections:
+            for frame in self.connections.pop(0):
+                await (websocket.send_str(frame) if isinstance(frame, str) else websocket.send_json(frame))
+            await websocket.close()
+        else:
+            # Keeps the connection open until the client closes it.
+            async for _ in websocket:
+                pass
+        return websocket
+
+
+def hello(seq, connection_id):
+    return {"event": "hello", "seq": seq, "data": {"connection_id": connection_id}, "broadcast": {}}
+
+
+def posted(seq, post_id):
+    post = {"id": post_id, "channel_id": "channel_id", "user_id": "user_id", "message": post_id, "create_at": 0, "type": "", "props": {}}
+    return {"event": "posted", "seq": seq, "data": {"channel_name": "channel", "post": json.dumps(post)}, "broadcast": {"channel_id": "channel_id"}}
+
+
+class MattermostEventStreamTests(SimpleTestCase):
+    async def stream_events(self, server, count):
+        """
+        Returns the first `count` events streamed from the server and the stream.
+        """
+        client = await server.start()
+        stream = MattermostEventStream(client, reconnect_delay=0.01, max_reconnect_delay=0.01, heartbeat=None)
+        events = []
+
+        async def collect():
+            async for event in stream:
+                events.append(event)
+                if len(events) == count:
+                    break
+
+        try:
+            await client.login()
+            await asyncio.wait_for(collect(), 5)
+        finally:
+            await stream.close()
+            await client.close()
+            await server.stop()
+        return events, stream
+
+    async def test_resumes_broken_connection(self):
+        server = FakeMattermostServer([[hello(0, "connection"), posted(1, "first")], [hello(2, "connection"), posted(3, "second")]])
+        events, stream = await self.stream_events(server, 4)
+
+        self.assertEqual([event["event"] for event in events], ["hello", "posted", "hello", "posted"])
+        self.assertEqual(server.queries, [{}, {"connection_id": "connection", "sequence_number": "2"}])
+        self.assertEqual(stream.missed_event_gaps, 0)
+
+    async def test_counts_gaps(self):
+        server = FakeMattermostServer([[hello(0, "connection"), posted(1, "first")], [hello(0, "new_connection"), posted(1, "second"), posted(3, "third")]])
+        with self.assertLogs("helpers.mattermostproxydriver.events", "WARNING") as logs:
+            events, stream = await self.stream_events(server, 5)
+
+        # The server could not resume the connection, then skipped the event 2.
+        self.assertEqual(stream.missed_event_gaps, 2)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(stream.connection_id, "new_connection")
+        self.assertEqual(stream.sequence, 4)
+
+    async def test_skips_malformed_frames(self):
+        server = FakeMattermostServer([[hello(0, "connection"), "{malformed", {"seq_reply": 1, "status": "OK"}, posted(1, "first")]])
+        with self.assertLogs("helpers.mattermostproxydriver.events", "WARNING"):
+            events, stream = await self.stream_events(server, 2)
+
+        self.assertEqual([event["event"] for event in events], ["hello", "posted"])
+        self.assertEqual(stream.missed_event_gaps, 0)
+
+
+class IngestMattermostEventsTests(SimpleTestCase):
+    async def test_retries_login(self):
+        server = FakeMattermostServer([], failed_logins=2)
+        client = await server.start()
+        try:
+            with self.assertLogs("apps.chat.management.commands.ingest_mattermost_events", "WARNING"):
+                await asyncio.wait_for(Command().login(client, reconnect_delay=0.01, max_reconnect_delay=0.01), 5)
+        finally:
+            await client.close()
+            await server.stop()
+
+        self.assertEqual(server.logins, 3)
+        self.assertEqual(client.token, "token")
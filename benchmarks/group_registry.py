@@ -0,0 +1,69 @@
+"""
+Benchmark of the subscription start/stop churn of a single connection.
+
+Compares the list based `_sids_by_group` registry previously used by GraphqlWsConsumer with GroupRegistry. Every
+subscription joins the group of its subscription class and a group of its own, as `OnNewChatMessage` subscriptions
+of the same channel do, then all of them are stopped in random order.
+
+Run from the project root:
+    python -m benchmarks.group_registry [--subscriptions N] [--rounds N]
+"""
+
+import argparse
+import random
+import time
+
+from helpers.channels_graphql_ws.group_registry import GroupRegistry
+
+
+def churn_list_registry(sids, groups_by_sid, stop_order):
+    """
+    Starts and stops the subscriptions the way the consumer did with lists of subscription ids.
+    """
+    sids_by_group = {}
+    start = time.perf_counter()
+    for sid in sids:
+        for group in groups_by_sid[sid]:
+            sids_by_group.setdefault(group, []).append(sid)
+    for sid in stop_order:
+        for group in groups_by_sid[sid]:
+            assert sids_by_group[group].count(sid) == 1
+            sids_by_group[group].remove(sid)
+            if not sids_by_group[group]:
+                del sids_by_group[group]
+    return time.perf_counter() - start
+
+
+def churn_group_registry(sids, groups_by_sid, stop_order):
+    """
+    Starts and stops the subscriptions with GroupRegistry.
+    """
+    registry = GroupRegistry()
+    start = time.perf_counter()
+    for sid in sids:
+        for group in groups_by_sid[sid]:
+            registry.add(group, sid)
+    for sid in stop_order:
+        for group in groups_by_sid[sid]:
+            registry.discard(group, sid)
+    return time.perf_counter() - start
+
+
+def main(subscriptions, rounds):
+    sids = list(range(subscriptions))
+    groups_by_sid = {sid: ("GQLWS-OnNewChatMessage", f"GQLWS-OnNewChatMessage-channel-{sid % 10}") for sid in sids}
+    results = {"list registry": 0.0, "GroupRegistry": 0.0}
+    for _ in range(rounds):
+        stop_order = random.sample(sids, len(sids))
+        results["list registry"] += churn_list_registry(sids, groups_by_sid, stop_order)
+        results["GroupRegistry"] += churn_group_registry(sids, groups_by_sid, stop_order)
+    for name, duration in results.items():
+        print(f"{name:<16} {duration / rounds * 1e3:>10.2f} ms per churn of {subscriptions} subscriptions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    main(args.subscriptions, args.rounds)
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the subscription notification queue.
+
+Compares the per-notification cost of the lock guarded `asyncio.Queue` previously used by GraphqlWsConsumer with the
+loop-confined NotificationBuffer. Each notification is put (as `_process_broadcast` does) and taken (as the
+subscription stream does) within the event loop.
+
+Run from the project root:
+    python -m benchmarks.notification_buffer [--notifications N] [--batch N]
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+from helpers.channels_graphql_ws.notification_buffer import NotificationBuffer
+
+
+async def run_locked_queue(notifications, batch):
+    """
+    Puts and takes notifications the way the consumer did with asyncio.Queue guarded by threading.RLock.
+    """
+    queue = asyncio.Queue(maxsize=1024)
+    lock = threading.RLock()
+    start = time.perf_counter()
+    for _ in range(notifications // batch):
+        for item in range(batch):
+            with lock:
+                queue.put_nowait(item)
+        for _ in range(batch):
+            with lock:
+                await queue.get()
+            with lock:
+                queue.task_done()
+    return time.perf_counter() - start
+
+
+async def run_notification_buffer(notifications, batch):
+    """
+    Puts and takes notifications with NotificationBuffer.
+    """
+    buffer = NotificationBuffer(maxsize=1024)
+    start = time.perf_counter()
+    for _ in range(notifications // batch):
+        for item in range(batch):
+            if buffer.full():
+                buffer.drop_oldest()
+            buffer.put_nowait(item)
+        for _ in range(batch):
+            await buffer.get()
+    return time.perf_counter() - start
+
+
+async def run_wakeups(buffer_factory, notifications):
+    """
+    Measures the round trip of a notification put while the reader task waits for it.
+    """
+    buffer = buffer_factory()
+    done = asyncio.Event()
+
+    async def reader():
+        for _ in range(notifications):
+            await buffer.get()
+        done.set()
+
+    task = asyncio.create_task(reader())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for item in range(notifications):
+        buffer.put_nowait(item)
+        await asyncio.sleep(0)
+    await done.wait()
+    await task
+    return time.perf_counter() - start
+
+
+async def main(notifications, batch):
+    results = {
+        "asyncio.Queue + RLock": await run_locked_queue(notifications, batch),
+        "NotificationBuffer": await run_notification_buffer(notifications, batch),
+        "asyncio.Queue wakeups": await run_wakeups(lambda: asyncio.Queue(maxsize=1024), notifications),
+        "NotificationBuffer wakeups": await run_wakeups(lambda: NotificationBuffer(maxsize=1024), notifications),
+    }
+    for name, duration in results.items():
+        print(f"{name:<28} {duration * 1e9 / notifications:>8.0f} ns/notification")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifications", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=100, help="Notifications put before the reader takes them.")
+    args = parser.parse_args()
+    asyncio.run(main(args.notifications, args.batch))
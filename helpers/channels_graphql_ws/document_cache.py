@@ -0,0 +1,258 @@
+# Copyright (C) DATADVANCE, 2010-2023
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Process-wide cache of parsed and validated GraphQL documents.
+
+The cache also implements the server side of automatic persisted
+queries (APQ) as they are sent by Apollo clients: instead of the query
+text, the client sends its SHA-256 hash in the request extensions
+```json
+{"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "<hash>"}}}
+```
+If the document is in the cache, it is executed without transferring,
+parsing and validating the query. Otherwise the client gets the
+`PersistedQueryNotFound` error and repeats the request with both the
+query text and the hash, which registers the document in the cache.
+"""
+
+import collections
+import hashlib
+import threading
+from typing import Any
+from typing import Collection
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+
+import graphql
+import graphql.utilities
+
+# Result of the document processing: AST of the parsed document,
+# definition of the operation to execute, and errors. The AST is `None`
+# when the document cannot be parsed, errors are `None` when it is
+# valid.
+ParsedDocument = Tuple[
+    Optional[graphql.DocumentNode],
+    Optional[graphql.OperationDefinitionNode],
+    Optional[List[graphql.GraphQLError]],
+]
+
+
+class PersistedQueryNotFound(graphql.GraphQLError):
+    """The client sent the hash of a query unknown to the server."""
+
+    def __init__(self):
+        """Create the error with the message Apollo clients expect."""
+        super().__init__("PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})
+
+
+class PersistedQueryHashMismatch(graphql.GraphQLError):
+    """The client sent a query along with a hash of another query."""
+
+    def __init__(self):
+        """Create the error."""
+        super().__init__("provided sha does not match query", extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"})
+
+
+def persisted_query_hash(extensions: Any) -> Optional[str]:
+    """Extract the hash of the persisted query from request extensions.
+
+    Returns `None` when the request does not use persisted queries.
+    """
+    if not isinstance(extensions, dict):
+        return None
+    persisted_query = extensions.get("persistedQuery")
+    if not isinstance(persisted_query, dict):
+        return None
+    query_hash = persisted_query.get("sha256Hash")
+    return query_hash.lower() if isinstance(query_hash, str) else None
+
+
+class DocumentCache:
+    """LRU cache of parsed and validated GraphQL documents.
+
+    Parsing and validation of a GraphQL document take a while and
+    depend approx. linearly on the size of the selection set, while
+    clients send the same few documents over and over again. The cache
+    is not bound to a WebSocket connection, so a document parsed once
+    serves all the connections of the process as well as HTTP requests.
+
+    Documents are keyed by the SHA-256 hash of the query text, so the
+    cache does not keep the texts themselves and a document can be
+    looked up by the hash only (see persisted queries above). Parse and
+    validation errors are cached as well.
+
+    Args:
+        max_size: The maximum number of documents kept in the cache.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        """Create an empty cache."""
+        self.max_size = max_size
+        # Number of lookups served from the cache and number of
+        # documents parsed and validated because of a cache miss.
+        self.hits = 0
+        self.misses = 0
+        self._documents: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of documents in the cache."""
+        return len(self._documents)
+
+    def parse(
+        self,
+        schema: graphql.GraphQLSchema,
+        query: Optional[str],
+        op_name: Optional[str],
+        validation_rules: Optional[Collection[Type[graphql.ASTValidationRule]]] = None,
+        max_errors: Optional[int] = None,
+        query_hash: Optional[str] = None,
+    ) -> ParsedDocument:
+        """Parse and validate the query, if it is not in the cache yet.
+
+        Args:
+            schema: The GraphQL schema to validate the query against.
+            query: Text of the GraphQL document. May be `None` for a
+                persisted query, then the `query_hash` is required.
+            op_name: Name of the operation to execute.
+            validation_rules: Validation rules, the specified rules of
+                GraphQL-core if `None`.
+            max_errors: The maximum number of validation errors.
+            query_hash: SHA-256 hash of the persisted query, if any.
+        Returns:
+            Tuple with three optional fields:
+                0: AST of parsed GraphQL document.
+                1: GraphQL operation definition.
+                2: Sequence of errors.
+        """
+        if query is None:
+            assert query_hash is not None, "Either the query or its hash must be given!"
+            document = self.get(schema, None, op_name, validation_rules, max_errors, query_hash=query_hash)
+            if document is None:
+                with self._lock:
+                    self.misses += 1
+                return None, None, [PersistedQueryNotFound()]
+            return document
+
+        actual_hash = self.query_hash(query)
+        if query_hash is not None and query_hash != actual_hash:
+            return None, None, [PersistedQueryHashMismatch()]
+
+        key = self.key(schema, actual_hash, op_name, validation_rules, max_errors)
+
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        # Parse outside the lock, so other threads are not blocked. Two
+        # threads may parse the same document concurrently, which is
+        # harmless.
+        document = self._parse(schema, query, op_name, validation_rules, max_errors)
+
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+
+        return document
+
+    def get(
+        self,
+        schema: graphql.GraphQLSchema,
+        query: Optional[str],
+        op_name: Optional[str],
+        validation_rules: Optional[Collection[Type[graphql.ASTValidationRule]]] = None,
+        max_errors: Optional[int] = None,
+        query_hash: Optional[str] = None,
+    ) -> Optional[ParsedDocument]:
+        """Return the cached document or `None` if it is not cached.
+
+        Cheap enough to be called from the event loop, so the cache hit
+        does not require offloading to a thread. Only hits are counted.
+        The document is looked up by the `query_hash` when the `query`
+        is `None`.
+        """
+        if query is not None:
+            if query_hash is not None and query_hash != self.query_hash(query):
+                # Let `parse` report the mismatch.
+                return None
+            query_hash = self.query_hash(query)
+        key = self.key(schema, query_hash, op_name, validation_rules, max_errors)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+        return document
+
+    def clear(self):
+        """Drop all the documents and reset the counters."""
+        with self._lock:
+            self._documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def key(
+        schema: graphql.GraphQLSchema,
+        query_hash: Optional[str],
+        op_name: Optional[str],
+        validation_rules: Optional[Collection[Type[graphql.ASTValidationRule]]] = None,
+        max_errors: Optional[int] = None,
+    ) -> Tuple[Any, ...]:
+        """Cache key of the query with the given hash."""
+        rules = tuple(validation_rules) if validation_rules is not None else None
+        return (schema, rules, max_errors, query_hash, op_name)
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        """SHA-256 hash of the query text, as persisted queries use."""
+        return hashlib.sha256(query.encode()).hexdigest()
+
+    @staticmethod
+    def _parse(schema, query, op_name, validation_rules, max_errors) -> ParsedDocument:
+        """Parse and validate the query."""
+
+        # Parsing.
+        try:
+            doc_ast = graphql.parse(query)
+        except graphql.GraphQLError as ex:
+            return None, None, [ex]
+
+        op_ast = graphql.utilities.get_operation_ast(doc_ast, op_name)
+
+        # Validation.
+        validation_errors: List[graphql.GraphQLError] = graphql.validate(schema, doc_ast, validation_rules, max_errors)
+        if validation_errors:
+            return doc_ast, op_ast, validation_errors
+
+        return doc_ast, op_ast, None
+
+
+# The cache shared by default by all the consumers of the process.
+document_cache = DocumentCache()
@@ -38,9 +38,12 @@ NOTE: Links based on which this functionality is implemented:
 """
 
 import asyncio
+import concurrent.futures
+import contextlib
 import dataclasses
 import functools
 import inspect
+import json
 import logging
 import threading
 import time
@@ -68,8 +71,23 @@ import graphql.execution
 import graphql.pyutils
 import graphql.utilities
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 from .dict_as_object import DictAsObject
-from .serializer import Serializer
+from .document_cache import DocumentCache
+from .document_cache import document_cache
+from .document_cache import persisted_query_hash
+from .group_registry import GroupRegistry
+from .notification_buffer import NotificationBuffer
+from .notification_cache import IdentityKey
+from .notification_cache import NotificationResultCache
+from .notification_cache import PayloadCache
+from .notification_cache import SharedExecutionResult
+from .notification_cache import notification_result_cache
+from .notification_cache import payload_cache
 
 # Module logger.
 LOG = logging.getLogger(__name__)
@@ -78,6 +96,79 @@ LOG = logging.getLogger(__name__)
 GRAPHQL_WS_SUBPROTOCOL = "graphql-ws"
 
 
+def dumps_json(content: Any) -> str:
+    """Encode the `content` to JSON text, with `orjson` if installed.
+
+    The `orjson` is several times faster than the standard `json`. The
+    standard `json` is used as a fallback for the content `orjson`
+    cannot encode, e.g. integers larger than 64 bits.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS).decode()
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(content)
+
+
+@dataclasses.dataclass
+class LoopBlockingStats:
+    """Time spent by GraphQL operations blocking the event loop.
+
+    Only the synchronous part of the operation execution performed on
+    the event loop is accounted, i.e. nothing is recorded for operations
+    executed in the thread pool (see `execute_in_executor`).
+    """
+
+    # Number of operations executed on the event loop.
+    operations: int = 0
+    # Total time the event loop was blocked (seconds).
+    total_seconds: float = 0.0
+    # The longest time a single operation blocked the loop (seconds).
+    max_seconds: float = 0.0
+    # Number of operations blocking the loop longer than the warning
+    # threshold (see `warn_loop_blocking_timeout`).
+    slow_operations: int = 0
+
+    def record(self, duration: float, slow: bool) -> None:
+        """Account an operation which blocked the loop for `duration`."""
+        self.operations += 1
+        self.total_seconds += duration
+        self.max_seconds = max(self.max_seconds, duration)
+        if slow:
+            self.slow_operations += 1
+
+
+@dataclasses.dataclass
+class NotificationQueueStats:
+    """Process-wide counters of the subscription notification queues."""
+
+    # Number of notifications dropped because of queue overflows.
+    dropped: int = 0
+    # The maximum number of notifications a queue held.
+    max_depth: int = 0
+    # Number of gap markers sent by the "gap_marker" policy.
+    gap_markers: int = 0
+    # Number of subscriptions switched to "latest only" delivery.
+    latest_only_switches: int = 0
+    # Number of connections closed by the "disconnect" policy.
+    disconnects: int = 0
+
+
+class NotificationsDropped(graphql.error.GraphQLError):
+    """Gap marker delivered in place of dropped notifications.
+
+    The client receives it as an error of the subscription `data`
+    message, the subscription itself keeps going.
+    """
+
+    def __init__(self, dropped: int):
+        super().__init__(
+            f"{dropped} subscription notifications dropped!",
+            extensions={"code": "NOTIFICATIONS_DROPPED", "dropped": dropped},
+        )
+
+
 class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
     """Channels consumer for the WebSocket GraphQL backend.
 
@@ -123,11 +214,90 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
     # specified number in seconds. None disables the warning.
     warn_operation_timeout: Optional[float] = 1
 
+    # Function encoding outgoing messages to JSON text. Uses `orjson`
+    # when it is installed, otherwise the standard `json`. Wrap a custom
+    # function into `staticmethod` when overriding.
+    json_encoder: Callable[[Any], str] = staticmethod(dumps_json)
+
+    # Set to `True` to execute queries and mutations in a thread pool
+    # instead of the event loop. Enable this when resolvers make
+    # blocking calls (e.g. synchronous HTTP requests), otherwise one
+    # slow operation stalls all the connections served by the process.
+    # Awaitables returned by the execution (i.e. async resolvers) are
+    # still awaited on the event loop.
+    execute_in_executor: bool = False
+
+    # The number of threads in the pool used by `execute_in_executor`.
+    # The pool is shared by all the connections of the consumer class.
+    executor_max_workers: int = 16
+
+    # The maximum number of operations of a single connection executing
+    # in the thread pool at the same time. Extra operations wait for
+    # their turn, so one client cannot occupy all the threads.
+    executor_max_operations_per_connection: int = 4
+
+    # Issue a warning to the log when an operation executed on the event
+    # loop blocks it longer than specified number in seconds. None
+    # disables the warning.
+    warn_loop_blocking_timeout: Optional[float] = 0.1
+
+    # Process-wide statistics of the event loop blocking time, e.g. to
+    # expose from a health check or to decide whether to enable
+    # `execute_in_executor`.
+    loop_blocking_stats: LoopBlockingStats = LoopBlockingStats()
+
+    # Cache of parsed and validated GraphQL documents. By default all
+    # the consumers of the process share the same cache, assign another
+    # `DocumentCache` instance to change the size or to share the cache
+    # with the HTTP view.
+    document_cache: DocumentCache = document_cache
+
+    # Cache of subscription notification results shared by subscribers
+    # of the process, used by subscriptions which enable
+    # `Subscription.share_notification_results`.
+    notification_result_cache: NotificationResultCache = notification_result_cache
+
+    # Cache of deserialized broadcast payloads shared by subscribers of
+    # the process, so each payload is deserialized once per process.
+    payload_cache: PayloadCache = payload_cache
+
     # The size of the subscription notification queue. If there are more
     # notifications (for a single subscription) than the given number,
-    # then an oldest notification is dropped and a warning is logged.
+    # then the `subscription_notification_overflow_policy` applies.
     subscription_notification_queue_limit: int = 1024
 
+    # What to do when a slow client lets the subscription notification
+    # queue overflow, `Subscription.notification_overflow_policy`
+    # overrides it for a subscription:
+    # "drop_oldest" - drop the oldest notification;
+    # "latest_only" - drop all the queued notifications and deliver only
+    #   the latest one from then on;
+    # "gap_marker" - drop the oldest notifications and deliver the
+    #   `NotificationsDropped` error telling how many were dropped
+    #   before the next notification;
+    # "disconnect" - drop the oldest notification and close the
+    #   connection when the queue keeps overflowing for
+    #   `slow_consumer_disconnect_timeout` seconds.
+    subscription_notification_overflow_policy: str = "drop_oldest"
+
+    # Seconds the queue must keep overflowing, i.e. the client does not
+    # catch up, before the "disconnect" policy closes the connection.
+    slow_consumer_disconnect_timeout: float = 10
+
+    # The minimal interval (in seconds) between two warnings about
+    # dropped notifications of a subscription. Drops in between are
+    # summed up in the next warning.
+    notification_drop_log_interval: float = 10
+
+    # The maximum number of `unsubscribed` callbacks running at the same
+    # time when all the subscriptions of a group are stopped at once by
+    # `Subscription.unsubscribe`.
+    unsubscribed_callbacks_max_concurrency: int = 16
+
+    # Process-wide counters of the notification queues, see also
+    # `notification_queue_depths`.
+    notification_queue_stats: NotificationQueueStats = NotificationQueueStats()
+
     # GraphQL middleware.
     # Instance of `graphql.MiddlewareManager` or the list of functions
     # (callables) like the following:
@@ -172,11 +342,25 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         """
         del op_id, payload
 
+    def notification_queue_depths(self) -> Dict[int, int]:
+        """Number of notifications queued for each subscription."""
+        return {sid: subinf.notification_queue.qsize() for sid, subinf in self._subscriptions.items()}
+
+    @classmethod
+    async def encode_json(cls, content):
+        """Encode outgoing messages with the `json_encoder`."""
+        return cls.json_encoder(content)
+
     # ------------------------------------------------------------------- IMPLEMENTATION
 
     # A prefix of Channel groups with subscription notifications.
     group_name_prefix: str = "GQLWS"
 
+    # Thread pool executing operations when `execute_in_executor` is
+    # set. Created on demand, one per consumer class.
+    _executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
     # Structure that holds subscription information.
     @dataclasses.dataclass
     class _SubInf:
@@ -186,19 +370,42 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         sid: int
         # Subscription groups the subscription belongs to.
         groups: List[str]
-        # A function which triggets subscription.
-        enqueue_notification: Callable[[Any], None]
+        # A function which triggets subscription with given payloads.
+        # NOTE: Must be called from the event loop thread.
+        enqueue_notification: Callable[..., None]
         # The callback to invoke when client unsubscribes.
         unsubscribed_callback: Callable[..., Awaitable[None]]
+        # The subscription notification queue.
+        notification_queue: NotificationBuffer
+
+    # Overflow state of the subscription notification queue.
+    @dataclasses.dataclass
+    class _QueueOverflow:
+        """Notification queue overflow structure."""
+
+        # Dropped notifications not reported with a gap marker yet.
+        dropped: int = 0
+        # Dropped notifications not reported to the log yet.
+        unlogged: int = 0
+        # When the drops were reported to the log last time.
+        logged_at: float = float("-inf")
+        # When the queue started to overflow, `None` when the client
+        # caught up with the notifications.
+        started_at: Optional[float] = None
+        # Set when the "latest_only" policy switched the subscription.
+        latest_only: bool = False
 
     def __init__(self, *args, **kwargs):
         """Consumer constructor."""
 
         assert self.schema is not None, "An attribute 'schema' is not set! Subclasses must specify " "the schema which processes GraphQL subscription queries."
+        assert self.subscription_notification_overflow_policy in ("drop_oldest", "latest_only", "gap_marker", "disconnect"), (
+            f"Consumer '{type(self).__qualname__}' has unknown" f" notification overflow policy '{self.subscription_notification_overflow_policy}'!"
+        )
 
         # Registry of active (subscribed) subscriptions.
         self._subscriptions: Dict[int, GraphqlWsConsumer._SubInf] = {}  # {'<sid>': '<SubInf>', ...}
-        self._sids_by_group = {}  # {'<grp>': ['<sid0>', '<sid1>', ...], ...}
+        self._sids_by_group = GroupRegistry()  # {'<grp>': {'<sid0>', '<sid1>', ...}, ...}
 
         # Tasks which send notifications to clients indexed by an
         # operation/subscription id.
@@ -218,6 +425,14 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         # throws away items when locks are garbage collected.
         self._operation_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
 
+        # Set when the connection is being closed because of a slow
+        # client, see `subscription_notification_overflow_policy`.
+        self._closing_slow_consumer = False
+
+        # Bounds the number of operations of this connection executing
+        # in the thread pool at the same time.
+        self._executor_semaphore = asyncio.Semaphore(self.executor_max_operations_per_connection)
+
         # MiddlewareManager maintains internal cache for resolvers
         # wrapped with middlewares. Using the same manager for all
         # operations improves performance.
@@ -347,12 +562,7 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         elif msg_type == "STOP":
             op_id = content["id"]
 
-            async def on_stop():
-                # Wait until START message processing finishes, if any.
-                async with self._operation_locks.setdefault(op_id, asyncio.Lock()):
-                    await self._on_gql_stop(op_id)
-
-            task = on_stop()
+            task = self._on_gql_stop_locked(op_id)
 
         else:
             task = self._send_gql_error(
@@ -407,10 +617,39 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         # Put the payload to the notification queues of subscriptions
         # belonging to the subscription group. Drop the oldest payloads
         # if the `notification_queue` is full.
-        for sid in self._sids_by_group[group]:
+        for sid in self._sids_by_group.sids(group):
             subinf = self._subscriptions[sid]
             subinf.enqueue_notification(payload)
 
+    async def broadcast_batch(self, message):
+        """The batched broadcast message handler.
+
+        Method is called when new `broadcast_batch` message (sent by
+        `Subscription.broadcast_many`) received from the Channels group.
+        The message carries several payloads for the same group.
+        """
+        if self.strict_ordering:
+            await self._process_broadcast_batch(message)
+        else:
+            self._spawn_background_task(self._process_broadcast_batch(message))
+
+    async def _process_broadcast_batch(self, message):
+        """Process the batched broadcast message.
+
+        The same as `_process_broadcast` but puts all the payloads of
+        the batch to the notification queues at once, in the order they
+        were broadcast.
+        """
+        group = message["group"]
+
+        if group not in self._sids_by_group:
+            return
+
+        payloads = message["payloads"]
+        for sid in self._sids_by_group.sids(group):
+            subinf = self._subscriptions[sid]
+            subinf.enqueue_notification(*payloads)
+
     async def unsubscribe(self, message):
         """The unsubscribe message handler.
 
@@ -427,12 +666,14 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         if group not in self._sids_by_group:
             return
 
-        # Send messages which look like user unsubscribes from all
-        # subscriptions in the subscription group. This saves us from
-        # thinking about raise condition between subscription and
-        # unsubscription.
-        if self._sids_by_group[group]:
-            await asyncio.wait([asyncio.create_task(self.receive_json({"type": "stop", "id": sid})) for sid in self._sids_by_group[group]])
+        # Stop all the subscriptions of the group in one pass, like the
+        # client sends STOP messages for them. So we still wait for
+        # START processing of each of them to finish.
+        stop = self._on_gql_stop_locked(*self._sids_by_group.sids(group))
+        if self.strict_ordering:
+            await stop
+        else:
+            self._spawn_background_task(stop)
 
     # ---------------------------------------------------------- GRAPHQL PROTOCOL EVENTS
 
@@ -504,10 +745,14 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                 message = f"Subscription with msg_id={op_id} already exists!"
                 raise graphql.error.GraphQLError(message)
 
-            # Get the message data.
-            query = payload["query"]
+            # Get the message data. The query text may be omitted when
+            # the client sends the hash of a persisted query instead.
+            query = payload.get("query")
+            query_hash = persisted_query_hash(payload.get("extensions"))
             op_name = payload.get("operationName")
             variables = payload.get("variables", {})
+            if query is None and query_hash is None:
+                raise graphql.error.GraphQLError("Must provide query string.")
 
             # Prepare a context object.
             context = DictAsObject({})
@@ -515,9 +760,13 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
             context.channel_name = self.channel_name
             context.graphql_operation_name = op_name
             context.graphql_operation_id = op_id
+            # Expose the authenticated user the same way Django requests do,
+            # so resolvers decorated with `login_required` work over WebSocket.
+            if "user" in self.scope:
+                context.user = self.scope["user"]
 
             # Process the request with Graphene and GraphQL-core.
-            doc_ast, op_ast, errors = await self._on_gql_start__parse_query(op_name, query)
+            doc_ast, op_ast, errors = await self._on_gql_start__parse_query(op_name, query, query_hash)
             if errors:
                 await self._send_gql_data(op_id, None, errors)
                 await self._send_gql_complete(op_id)
@@ -576,7 +825,10 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                                 # when we have something to send.
                                 if item.data or item.errors:
                                     try:
-                                        await self._send_gql_data(op_id, item.data, item.errors)
+                                        if isinstance(item, SharedExecutionResult):
+                                            await self._send_gql_data_shared(op_id, item)
+                                        else:
+                                            await self._send_gql_data(op_id, item.data, item.errors)
                                     except asyncio.CancelledError:
                                         break
                         except Exception as ex:  # pylint: disable=broad-except
@@ -627,8 +879,9 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                     # IntrospectionQuery. There no real resolvers. Only
                     # the type information.
                     middleware_manager = None
-                exec_result = graphql.execution.execute(
-                    self.schema.graphql_schema,
+                exec_result = await self._on_gql_start__execute(
+                    op_id,
+                    op_name,
                     document=doc_ast,
                     root_value=None,
                     operation_name=op_name,
@@ -636,8 +889,6 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                     context_value=context,
                     middleware=middleware_manager,
                 )
-                if inspect.isawaitable(exec_result):
-                    exec_result = await exec_result
                 operation_result = cast(graphql.ExecutionResult, exec_result)
 
                 if self.warn_operation_timeout is not None:
@@ -671,18 +922,79 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                 # Respond with general error responce.
                 await self._send_gql_error(op_id, ex)
 
+    async def _on_gql_start__execute(self, op_id, op_name, **kwds) -> graphql.ExecutionResult:
+        """Execute query or mutation.
+
+        Depending on the `execute_in_executor` setting the synchronous
+        part of the execution runs either in the thread pool or right on
+        the event loop. In the latter case the time the loop is blocked
+        is accounted in `loop_blocking_stats`. If the execution returns
+        an awaitable (there are async resolvers), it is awaited on the
+        event loop in both cases.
+
+        This is a part of START message processing routine so the name
+        prefixed with `_on_gql_start__` to make this explicit.
+        """
+        execute = functools.partial(graphql.execution.execute, self.schema.graphql_schema, **kwds)
+
+        if self.execute_in_executor:
+            async with self._executor_semaphore:
+                # NOTE: `database_sync_to_async` closes stale database
+                # connections of the worker thread, exactly like Django
+                # does at the end of an HTTP request.
+                exec_result = await channels.db.database_sync_to_async(execute, thread_sensitive=False, executor=self._get_executor())()
+        else:
+            start_time = time.perf_counter()
+            exec_result = execute()
+            duration = time.perf_counter() - start_time
+
+            slow = self.warn_loop_blocking_timeout is not None and duration >= self.warn_loop_blocking_timeout
+            self.loop_blocking_stats.record(duration, slow)
+            if slow:
+                LOG.warning(
+                    "Operation %s(%s) blocked the event loop for %.6f seconds." " Consider enabling `execute_in_executor`.",
+                    op_name,
+                    op_id,
+                    duration,
+                )
+
+        if inspect.isawaitable(exec_result):
+            exec_result = await exec_result
+        return cast(graphql.ExecutionResult, exec_result)
+
+    @classmethod
+    def _get_executor(cls) -> concurrent.futures.ThreadPoolExecutor:
+        """Thread pool executing operations, created on first use."""
+        # NOTE: Check the class dict, so subclasses with different
+        # `executor_max_workers` do not share the pool of the parent.
+        if cls.__dict__.get("_executor") is None:
+            with cls._executor_lock:
+                if cls.__dict__.get("_executor") is None:
+                    cls._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=cls.executor_max_workers,
+                        thread_name_prefix=f"{cls.__name__}-executor",
+                    )
+        return cast(concurrent.futures.ThreadPoolExecutor, cls._executor)
+
     async def _on_gql_start__parse_query(
-        self, op_name: str, query: str
+        self, op_name: str, query: Optional[str], query_hash: Optional[str] = None
     ) -> Tuple[Optional[graphql.DocumentNode], Optional[graphql.OperationDefinitionNode], Optional[Iterable[graphql.GraphQLError]],]:
         """Parse and validate GraphQL query.
 
         It is highly likely that the same operation will be parsed many
-        times, so this function is wrapped with LRU cache.
+        times, so parsed documents are kept in the `document_cache`
+        shared by all the connections.
+
+        On a cache miss this async function offloads the GraphQL
+        processing to the worker thread cause according to our
+        experiments even GraphQL document parsing and validation take a
+        while and depends approx. linearly on the size of the selection
+        set.
 
-        This async function offloads the GraphQL processing to the
-        worker thread cause according to our experiments even GraphQL
-        document parsing and validation take a while and depends approx.
-        linearly on the size of the selection set.
+        When the client sends the `query_hash` of a persisted query
+        without the `query` itself, the document is only looked up in
+        the cache, and `PersistedQueryNotFound` error is returned if it
+        is not there.
 
         This is a part of START message processing routine so the name
         prefixed with `_on_gql_start__` to make this explicit.
@@ -694,7 +1006,15 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                 2: Sequence of errors.
         """
 
-        res = await channels.db.database_sync_to_async(self._on_gql_start__parse_query_sync_cached, thread_sensitive=False)(op_name, query)
+        res = self.document_cache.get(self.schema.graphql_schema, query, op_name, query_hash=query_hash)
+        if res is None:
+            if query is None:
+                # Nothing to parse, just report the unknown hash.
+                res = self.document_cache.parse(self.schema.graphql_schema, None, op_name, query_hash=query_hash)
+            else:
+                res = await channels.db.database_sync_to_async(self.document_cache.parse, thread_sensitive=False)(
+                    self.schema.graphql_schema, query, op_name, query_hash=query_hash
+                )
 
         doc_ast: Optional[graphql.DocumentNode] = res[0]
         op_ast: Optional[graphql.OperationDefinitionNode] = res[1]
@@ -702,31 +1022,6 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
 
         return (doc_ast, op_ast, errors)
 
-    @functools.lru_cache(maxsize=128)
-    def _on_gql_start__parse_query_sync_cached(
-        self, op_name: str, query: str
-    ) -> Tuple[Optional[graphql.DocumentNode], Optional[graphql.OperationDefinitionNode], Optional[Iterable[graphql.GraphQLError]],]:
-        """Parse and validate GraphQL query. Cached sync implementation.
-
-        This is a part of START message processing routine so the name
-        prefixed with `_on_gql_start__` to make this explicit.
-        """
-
-        # Parsing.
-        try:
-            doc_ast = graphql.parse(query)
-        except graphql.GraphQLError as ex:
-            return None, None, [ex]
-
-        # Validation.
-        validation_errors: List[graphql.GraphQLError] = graphql.validate(self.schema.graphql_schema, doc_ast)
-        if validation_errors:
-            return None, None, validation_errors
-
-        op_ast = graphql.utilities.get_operation_ast(doc_ast, op_name)
-
-        return doc_ast, op_ast, None
-
     async def _on_gql_start__subscribe(
         self,
         document: graphql.DocumentNode,
@@ -761,18 +1056,17 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
         if isinstance(result_or_stream, graphql.ExecutionResult):
             return result_or_stream
 
-        async def map_source_to_response(payload: Any) -> graphql.ExecutionResult:
-            """Map source to response.
+        async def execute_notification(serialized_payload: Union[bytes, Tuple[bytes, ...]]) -> graphql.ExecutionResult:
+            """Deserialize the payload and execute the document.
 
-            For each payload yielded from a subscription, map it over
-            the normal GraphQL :func:`~graphql.execute` function, with
-            `payload` as the `root_value`. This implements the
-            "MapSourceToResponseEvent" algorithm described in the
-            GraphQL specification. The :func:`~graphql.execute` function
-            provides the "ExecuteSubscriptionEvent" algorithm, as it is
-            nearly identical to the "ExecuteQuery" algorithm, for which
-            :func:`~graphql.execute` is also used.
+            The tuple of payloads comes from the subscription which
+            coalesces notifications in the "batch" mode, its `publish`
+            receives the list of the payloads.
             """
+            if isinstance(serialized_payload, tuple):
+                payload = list(await asyncio.gather(*[self.payload_cache.deserialize(item) for item in serialized_payload]))
+            else:
+                payload = await self.payload_cache.deserialize(serialized_payload)
             result = graphql.execute(
                 self.schema.graphql_schema,
                 document,
@@ -793,6 +1087,42 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                         result.data.pop(key)
             return result
 
+        async def map_source_to_response(notification: Tuple[Union[bytes, Tuple[bytes, ...]], bool]) -> graphql.ExecutionResult:
+            """Map source to response.
+
+            For each payload yielded from a subscription, map it over
+            the normal GraphQL :func:`~graphql.execute` function, with
+            `payload` as the `root_value`. This implements the
+            "MapSourceToResponseEvent" algorithm described in the
+            GraphQL specification. The :func:`~graphql.execute` function
+            provides the "ExecuteSubscriptionEvent" algorithm, as it is
+            nearly identical to the "ExecuteQuery" algorithm, for which
+            :func:`~graphql.execute` is also used.
+
+            The stream yields serialized payloads along with the flag
+            telling if the result may be shared with other subscribers.
+            Shared results are keyed by the document, the variables and
+            the serialized payload. NOTE: Thanks to the `document_cache`
+            the same document is the same object for all the
+            connections. The key references the document, so the
+            result entry keeps it alive and a document parsed after
+            this one is evicted from `document_cache` never gets its
+            results.
+            """
+            serialized_payload, share_results = notification
+            if isinstance(serialized_payload, NotificationsDropped):
+                return graphql.ExecutionResult(None, [serialized_payload])
+            if not share_results:
+                return await execute_notification(serialized_payload)
+
+            async def execute_shared_notification() -> graphql.ExecutionResult:
+                result = await execute_notification(serialized_payload)
+                return SharedExecutionResult(result.data, result.errors, result.extensions)
+
+            variables_key = json.dumps(variable_values, sort_keys=True, default=str)
+            key = (IdentityKey(document), operation_name, variables_key, serialized_payload)
+            return await self.notification_result_cache.get_or_execute(key, execute_shared_notification)
+
         # Map every source value to a ExecutionResult value.
         return graphql.MapAsyncIterator(result_or_stream, map_source_to_response)
 
@@ -849,6 +1179,8 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
             subclass_groups = []
 
         groups += [subscription_class._group_name(group) for group in subclass_groups]
+        # The same group listed twice means the same Channels group.
+        groups = list(dict.fromkeys(groups))
 
         # The subscription notification queue. Required to preserve the
         # order of notifications within a single subscription.
@@ -857,13 +1189,9 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
             # Take default limit from the Consumer class.
             queue_size = self.subscription_notification_queue_limit
         # The subscription notification queue.
-        # NOTE: The asyncio.Queue class is not thread-safe. So use the
-        # `notification_queue_lock` as a guard while reading or writing
-        # to the queue.
-        notification_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
-        # Lock to ensure that `notification_queue` operations are
-        # thread safe.
-        notification_queue_lock = threading.RLock()
+        # NOTE: The buffer is confined to the event loop, so it needs no
+        # locks.
+        notification_queue = NotificationBuffer(maxsize=queue_size)
 
         unsubscribed = subscription_class._meta.unsubscribed
 
@@ -881,124 +1209,240 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
             if inspect.isawaitable(result):
                 result = await result
 
-        def enqueue_notification(payload):
-            """Put notification to the queue.
+        overflow_policy = subscription_class.notification_overflow_policy or self.subscription_notification_overflow_policy
+        overflow = self._QueueOverflow()
+        stats = self.notification_queue_stats
+
+        def drop_notifications(count, warn=True):
+            """Drop the oldest notifications from the queue.
+
+            Warnings are rate limited by `notification_drop_log_interval`
+            so a slow client does not flood the log.
+            """
+            notification_queue.drop_oldest(count)
+            stats.dropped += count
+            overflow.dropped += count
+            if not warn:
+                return
+            overflow.unlogged += count
+            now = time.monotonic()
+            if now - overflow.logged_at >= self.notification_drop_log_interval:
+                LOG.warning(
+                    "%s subscription notifications dropped! Operation %s(%s).",
+                    overflow.unlogged,
+                    operation_name,
+                    operation_id,
+                )
+                overflow.unlogged = 0
+                overflow.logged_at = now
+
+        def handle_queue_overflow():
+            """Make room in the full queue according to the policy."""
+            # NOTE: Queue with the size 1 means that it is safe to drop
+            # intermediate notifications.
+            if notification_queue.maxsize == 1:
+                notification_queue.drop_oldest()
+                return
+
+            now = time.monotonic()
+            if overflow.started_at is None:
+                overflow.started_at = now
+
+            if overflow_policy == "latest_only":
+                LOG.warning(
+                    "Subscription notification queue overflow, delivering only the latest notification from now on! Operation %s(%s).",
+                    operation_name,
+                    operation_id,
+                )
+                stats.latest_only_switches += 1
+                overflow.latest_only = True
+                drop_notifications(notification_queue.qsize(), warn=False)
+                return
+
+            drop_notifications(1)
+
+            if overflow_policy == "disconnect" and not self._closing_slow_consumer and now - overflow.started_at >= self.slow_consumer_disconnect_timeout:
+                LOG.warning(
+                    "Client does not keep up with the notifications for %.1f seconds, disconnecting! Operation %s(%s).",
+                    now - overflow.started_at,
+                    operation_name,
+                    operation_id,
+                )
+                stats.disconnects += 1
+                self._closing_slow_consumer = True
+                # Code 1008 "Policy Violation".
+                self._spawn_background_task(self.close(code=1008))
+
+        def enqueue_notification(*payloads):
+            """Put notifications to the queue.
 
             Called by the WebSocket consumer (instance of the
             GraphqlWsConsumer subclass) when it receives the broadcast
             message (from the Channels group) sent by the
-            Subscription.broadcast.
+            Subscription.broadcast. Several payloads come at once with
+            the batch sent by the Subscription.broadcast_many.
 
             Args:
-                sid: Operation id of the subscription.
+                payloads: Serialized notification payloads.
             """
-            while True:
-                with notification_queue_lock:
-                    try:
-                        notification_queue.put_nowait(payload)
-                        break  # The item was enqueued. Exit the loop.
-                    except asyncio.QueueFull:
-                        # The queue is full - issue a warning and throw
-                        # away the oldest item from the queue.
-                        # NOTE: Queue with the size 1 means that it is
-                        # safe to drop intermediate notifications.
-                        if notification_queue.maxsize != 1:
-                            LOG.warning(
-                                "Subscription notification dropped! Operation %s(%s).",
-                                operation_name,
-                                operation_id,
-                            )
-                        notification_queue.get_nowait()
-                        notification_queue.task_done()
-
-                        # Try to put the incoming item to the queue
-                        # within the same lock. This is an speed
-                        # optimization.
-                        try:
-                            notification_queue.put_nowait(payload)
-                            # The item was enqueued. Exit the loop.
-                            break
-                        except asyncio.QueueFull:
-                            # Kind'a impossible to get here, but if we
-                            # do, then we should retry until the queue
-                            # have capacity to process item.
-                            pass
+            for payload in payloads:
+                if overflow.latest_only:
+                    drop_notifications(notification_queue.qsize(), warn=False)
+                elif notification_queue.full():
+                    handle_queue_overflow()
+                notification_queue.put_nowait(payload)
+            stats.max_depth = max(stats.max_depth, notification_queue.qsize())
+
+        def take_gap_marker():
+            """Gap marker to deliver before the notification just taken.
+
+            Called right after notifications are taken from the queue.
+            """
+            if notification_queue.empty():
+                # The client caught up with the notifications.
+                overflow.started_at = None
+            dropped, overflow.dropped = overflow.dropped, 0
+            if not dropped or overflow_policy != "gap_marker":
+                return None
+            stats.gap_markers += 1
+            return NotificationsDropped(dropped)
 
         waitlist = []
         for group in groups:
-            self._sids_by_group.setdefault(group, []).append(operation_id)
+            self._sids_by_group.add(group, operation_id)
             waitlist.append(asyncio.create_task(self._channel_layer.group_add(group, self.channel_name)))
         self._subscriptions[operation_id] = self._SubInf(
             groups=groups,
             sid=operation_id,
             unsubscribed_callback=unsubscribed_callback,
             enqueue_notification=enqueue_notification,
+            notification_queue=notification_queue,
         )
         if waitlist:
             await asyncio.wait(waitlist)
 
-        _deserialize = channels.db.database_sync_to_async(Serializer.deserialize, thread_sensitive=False)
+        share_results = subscription_class.share_notification_results
+        coalesce_window = subscription_class.notification_coalesce_window
 
         # For each notification (event) yielded from this function the
-        # `_on_gql_start__subscribe` function will call subscription
-        # resolver (`publish`) via `graphql.execute` method.
-        while True:
-            with notification_queue_lock:
+        # `_on_gql_start__subscribe` function will deserialize it and
+        # call subscription resolver (`publish`) via `graphql.execute`
+        # method. Deserialization happens there so subscribers sharing
+        # the result do not deserialize the payload at all.
+        if not coalesce_window:
+            while True:
                 payload = await notification_queue.get()
-            data = await _deserialize(payload)
-            yield data
-            with notification_queue_lock:
-                notification_queue.task_done()
-
-    async def _on_gql_stop(self, op_id):
+                gap_marker = take_gap_marker()
+                if gap_marker is not None:
+                    yield gap_marker, False
+                yield payload, share_results
+
+        # The notification which comes after a quiet period is delivered
+        # right away, the ones which come within the window after it are
+        # accumulated in the queue and coalesced when the window ends.
+        loop = asyncio.get_running_loop()
+        delivered_at = -coalesce_window
+        while True:
+            payloads = [await notification_queue.get()]
+            delay = delivered_at + coalesce_window - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            payloads += notification_queue.get_all_nowait()
+            gap_marker = take_gap_marker()
+            if gap_marker is not None:
+                yield gap_marker, False
+            for notification in await self._coalesce_notifications(subscription_class, payloads):
+                yield notification, share_results
+            delivered_at = loop.time()
+
+    async def _coalesce_notifications(self, subscription_class, payloads: List[bytes]) -> List[Union[bytes, Tuple[bytes, ...]]]:
+        """Coalesce serialized payloads accumulated within the window.
+
+        Returns the notifications to deliver according to the
+        `notification_coalesce_mode` of the subscription class.
+        """
+        if subscription_class.notification_coalesce_mode == "batch":
+            return [tuple(payloads)]
+
+        key = subscription_class.notification_coalesce_key
+        if key is None or len(payloads) == 1:
+            return [payloads[-1]]
+
+        # Keep the latest payload per key, in the order the latest
+        # payloads came.
+        latest: Dict[Any, bytes] = {}
+        for serialized_payload in payloads:
+            payload_key = key(await self.payload_cache.deserialize(serialized_payload))
+            latest.pop(payload_key, None)
+            latest[payload_key] = serialized_payload
+        return list(latest.values())
+
+    async def _on_gql_stop_locked(self, *op_ids):
+        """Process the STOP message under the operation locks.
+
+        Waits until START message processing of the operations finishes,
+        if any, see the `receive_json` handler.
+        """
+        async with contextlib.AsyncExitStack() as stack:
+            # NOTE: Locks are acquired in the same order by everyone to
+            # avoid deadlocks between concurrent bulk stops.
+            for op_id in sorted(op_ids, key=str):
+                await stack.enter_async_context(self._operation_locks.setdefault(op_id, asyncio.Lock()))
+            await self._on_gql_stop(*op_ids)
+
+    async def _on_gql_stop(self, *op_ids):
         """Process the STOP message.
 
-        Handle an unsubscribe request.
+        Handle an unsubscribe request. Several operations are stopped in
+        one pass when the server stops all the subscriptions of a group,
+        then each Channels group is discarded at most once and the
+        `unsubscribed` callbacks run concurrently, at most
+        `unsubscribed_callbacks_max_concurrency` at a time.
 
         NOTE: Depending on the value of the `strict_ordering` setting
         this method is either awaited directly or offloaded to an async
         task. See the `receive_json` handler.
         """
-        LOG.debug("Stop handling or unsubscribe operation %s.", op_id)
+        LOG.debug("Stop handling or unsubscribe operations %s.", op_ids)
 
         # Currently only subscriptions can be stopped. But we see but
         # some clients (e.g. GraphiQL) send the stop message even for
         # queries and mutations. We also see that the Apollo server
         # ignores such messages, so we ignore them as well.
-        if op_id not in self._subscriptions:
+        # Remove the subscriptions from the registry.
+        subinfs = [self._subscriptions.pop(op_id) for op_id in op_ids if op_id in self._subscriptions]
+        if not subinfs:
             return
 
         waitlist: List[asyncio.Task] = []
 
-        # Remove the subscription from the registry.
-        subinf = self._subscriptions.pop(op_id)
-
-        # Cancel the task which watches the notification queue.
-        consumer_task = self._notifier_tasks.pop(op_id, None)
-        if consumer_task:
-            consumer_task.cancel()
-            waitlist.append(consumer_task)
-
-        # Stop listening for corresponding groups.
-        for group in subinf.groups:
-            # Remove the subscription from groups it belongs to. Remove
-            # the group itself from the `_sids_by_group` if there are no
-            # subscriptions left in it.
-            assert self._sids_by_group[group].count(op_id) == 1, (
-                f"Registry is inconsistent: group '{group}' has " f"{self._sids_by_group[group].count(op_id)} " "occurrences of op_id={op_id}!"
-            )
-            self._sids_by_group[group].remove(op_id)
-            if not self._sids_by_group[group]:
-                del self._sids_by_group[group]
-                waitlist.append(asyncio.create_task(self._channel_layer.group_discard(group, self.channel_name)))
+        for subinf in subinfs:
+            # Cancel the task which watches the notification queue.
+            consumer_task = self._notifier_tasks.pop(subinf.sid, None)
+            if consumer_task:
+                consumer_task.cancel()
+                waitlist.append(consumer_task)
+
+            # Stop listening for corresponding groups.
+            for group in subinf.groups:
+                # Remove the subscription from groups it belongs to. The
+                # registry removes the group itself if there are no
+                # subscriptions left in it.
+                if self._sids_by_group.discard(group, subinf.sid):
+                    waitlist.append(asyncio.create_task(self._channel_layer.group_discard(group, self.channel_name)))
 
         if waitlist:
             await asyncio.wait(waitlist)
 
-        await subinf.unsubscribed_callback()
+        semaphore = asyncio.Semaphore(self.unsubscribed_callbacks_max_concurrency)
+
+        async def finish(subinf):
+            async with semaphore:
+                await subinf.unsubscribed_callback()
+            # Send the unsubscription confirmation message.
+            await self._send_gql_complete(subinf.sid)
 
-        # Send the unsubscription confirmation message.
-        await self._send_gql_complete(op_id)
+        await asyncio.gather(*[finish(subinf) for subinf in subinfs])
 
     # -------------------------------------------------------- GRAPHQL PROTOCOL MESSAGES
 
@@ -1019,9 +1463,45 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
             errors: List of exceptions occurred during processing the
                 GraphQL query. (Errors happened in resolvers.)
         """
+        self._log_gql_errors(op_id, errors)
+        await self.send_json(
+            {
+                "type": "data",
+                "id": op_id,
+                "payload": self._gql_data_payload(data, errors),
+            }
+        )
+
+    async def _send_gql_data_shared(self, op_id, result: SharedExecutionResult):
+        """Send GraphQL `data` message with the result shared by subscribers.
+
+        The payload of the message is encoded to JSON once and the text
+        is reused by all the subscribers, only the frame around the
+        payload is built for each client.
+        """
+        self._log_gql_errors(op_id, result.errors)
+        encoded_payload = result.encoded_payloads.get(type(self))
+        if encoded_payload is None:
+            encoded_payload = self.json_encoder(self._gql_data_payload(result.data, result.errors))
+            result.encoded_payloads[type(self)] = encoded_payload
+        await self.send(text_data=f'{{"type":"data","id":{self.json_encoder(op_id)},"payload":{encoded_payload}}}')
+
+    def _gql_data_payload(self, data: Optional[dict], errors: Optional[Iterable[Exception]]) -> dict:
+        """Payload of the GraphQL `data` message."""
+        return {
+            "data": data,
+            **({"errors": [self._format_error(e) for e in errors]} if errors else {}),  # type: ignore
+        }
+
+    @staticmethod
+    def _log_gql_errors(op_id, errors: Optional[Iterable[Exception]]):
+        """Log errors of the GraphQL `data` message."""
         # Log errors with tracebacks so we can understand what happened
         # in a failed resolver.
         for ex in errors or []:
+            # Dropped notifications are already logged when dropped.
+            if isinstance(ex, NotificationsDropped):
+                continue
             # Typical exception here is `GraphQLLocatedError` which has
             # reference to the original error raised from a resolver.
             tb = ex.__traceback__
@@ -1031,17 +1511,6 @@ class GraphqlWsConsumer(ch_websocket.AsyncJsonWebsocketConsumer):
                 "".join(traceback.format_exception(type(ex), ex, tb)).strip(),
             )
 
-        await self.send_json(
-            {
-                "type": "data",
-                "id": op_id,
-                "payload": {
-                    "data": data,
-                    **({"errors": [self._format_error(e) for e in errors]} if errors else {}),  # type: ignore
-                },
-            }
-        )
-
     async def _send_gql_error(self, op_id, error: Exception):
         """Tell client there is a query processing error.
 
@@ -0,0 +1,95 @@
+# Copyright (C) DATADVANCE, 2010-2023
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Registry of the subscriptions of a connection by Channels groups."""
+
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+
+
+class GroupRegistry:
+    """Subscription ids of a connection indexed by the Channels group.
+
+    Both adding and removing a subscription take constant time, so a
+    connection with many subscriptions in the same group (and stopping
+    all of them) does not degrade quadratically. Subscription ids of a
+    group are kept in the order they were added.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        # NOTE: Dicts are used as ordered sets.
+        self._sids_by_group: Dict[str, Dict[int, None]] = {}  # {'<grp>': {'<sid0>': None, ...}, ...}
+
+    def add(self, group: str, sid: int) -> bool:
+        """Add the subscription to the group.
+
+        Returns:
+            `True` if the group is new, i.e. the connection must be added
+            to the Channels group.
+
+        """
+        sids = self._sids_by_group.get(group)
+        is_new = sids is None
+        if is_new:
+            sids = self._sids_by_group[group] = {}
+        assert sid not in sids, f"Registry is inconsistent: group '{group}' already has op_id={sid}!"
+        sids[sid] = None
+        return is_new
+
+    def discard(self, group: str, sid: int) -> bool:
+        """Remove the subscription from the group.
+
+        Returns:
+            `True` if the group has no subscriptions left and is removed,
+            i.e. the connection must be discarded from the Channels
+            group.
+
+        """
+        sids = self._sids_by_group.get(group, {})
+        assert sid in sids, f"Registry is inconsistent: group '{group}' has no op_id={sid}!"
+        del sids[sid]
+        if sids:
+            return False
+        del self._sids_by_group[group]
+        return True
+
+    def sids(self, group: str) -> Iterable[int]:
+        """Subscription ids of the group, empty if there is no group.
+
+        NOTE: The result is a live view, copy it to modify the registry
+        while iterating.
+        """
+        return self._sids_by_group.get(group, {}).keys()
+
+    def clear(self) -> None:
+        """Remove all the groups."""
+        self._sids_by_group.clear()
+
+    def __contains__(self, group: object) -> bool:
+        return group in self._sids_by_group
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sids_by_group)
+
+    def __len__(self) -> int:
+        return len(self._sids_by_group)
@@ -0,0 +1,111 @@
+# Copyright (C) DATADVANCE, 2010-2023
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Loop-confined buffer of subscription notifications."""
+
+import asyncio
+import collections
+from typing import Any
+from typing import Deque
+from typing import List
+from typing import Optional
+
+
+class NotificationBuffer:
+    """Bounded FIFO buffer of the notifications of a subscription.
+
+    A lightweight replacement of `asyncio.Queue` for the notification
+    hot path: the buffer is confined to the event loop it is created in,
+    so it needs no locks, and it has exactly one reader (the stream of
+    the subscription) which is the only waiter to wake up.
+
+    NOTE: All the methods must be called from the event loop thread.
+    Producers running in other threads must schedule the calls with
+    `loop.call_soon_threadsafe`, the `loop` attribute is exposed for
+    that.
+
+    The buffer does not decide what to drop on overflow: the caller
+    checks `full()` and makes room (e.g. with `drop_oldest`) according
+    to its policy, `put_nowait` raises `asyncio.QueueFull` otherwise.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        """Constructor.
+
+        Args:
+            maxsize: The maximum number of items, `0` means unbounded.
+
+        """
+        self.maxsize = maxsize
+        self.loop = asyncio.get_running_loop()
+        self._items: Deque[Any] = collections.deque()
+        # The future the reader awaits while the buffer is empty.
+        self._waiter: Optional[asyncio.Future] = None
+
+    def qsize(self) -> int:
+        """Number of items in the buffer."""
+        return len(self._items)
+
+    def empty(self) -> bool:
+        """Tell whether the buffer is empty."""
+        return not self._items
+
+    def full(self) -> bool:
+        """Tell whether the buffer has no room for an item."""
+        return 0 < self.maxsize <= len(self._items)
+
+    def put_nowait(self, item: Any) -> None:
+        """Append the item, raise `asyncio.QueueFull` if it is full."""
+        if self.full():
+            raise asyncio.QueueFull
+        self._items.append(item)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def get_nowait(self) -> Any:
+        """Pop the oldest item, raise `asyncio.QueueEmpty` if empty."""
+        if not self._items:
+            raise asyncio.QueueEmpty
+        return self._items.popleft()
+
+    def get_all_nowait(self) -> List[Any]:
+        """Pop all the items."""
+        items = list(self._items)
+        self._items.clear()
+        return items
+
+    async def get(self) -> Any:
+        """Pop the oldest item, wait for it if the buffer is empty."""
+        while not self._items:
+            assert self._waiter is None, "Notification buffer supports a single reader!"
+            self._waiter = self.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._items.popleft()
+
+    def drop_oldest(self, count: int = 1) -> None:
+        """Drop at most `count` oldest items."""
+        items = self._items
+        for _ in range(min(count, len(items))):
+            items.popleft()
@@ -0,0 +1,190 @@
+# Copyright (C) DATADVANCE, 2010-2023
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Process-wide sharing of subscription notification processing."""
+
+import asyncio
+import collections
+import weakref
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+
+import channels.db
+import graphql
+
+from .serializer import Serializer
+
+
+class SharedExecutionResult(graphql.ExecutionResult):
+    """Execution result shared by subscribers.
+
+    Besides the result itself, it keeps the JSON encoded message payload
+    so the result is encoded once for all the subscribers, not once per
+    subscriber. The payload is kept per consumer class, since consumer
+    classes may encode messages differently.
+    """
+
+    __slots__ = ("encoded_payloads",)
+
+    def __init__(self, *args, **kwds):
+        """Create the result with no encoded payloads."""
+        super().__init__(*args, **kwds)
+        self.encoded_payloads: Dict[type, str] = {}
+
+
+class IdentityKey:
+    """Hashable reference to an object, compared by identity.
+
+    Unlike the bare `id` of the object, the key keeps the object alive
+    while it is stored in a cache, so it never matches another object
+    which gets the same `id` once the first one is collected.
+    """
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj: Any):
+        """Reference the object."""
+        self.obj = obj
+
+    def __hash__(self):
+        """Hash the identity of the object."""
+        return id(self.obj)
+
+    def __eq__(self, other):
+        """Tell whether the other key references the same object."""
+        return isinstance(other, IdentityKey) and other.obj is self.obj
+
+
+class SharedResultCache:
+    """Results of coroutines shared by the tasks of the process.
+
+    The first task requesting a key runs the coroutine, the others
+    requesting the same key while the result is in the cache await the
+    same execution. The execution is shielded from the task which has
+    started it, so its cancellation does not break the others waiting
+    for the result. Results are kept for `ttl` seconds.
+
+    Args:
+        ttl: Number of seconds the result stays in the cache.
+        max_size: The maximum number of results kept in the cache.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_size: int = 1024):
+        """Create an empty cache."""
+        self.ttl = ttl
+        self.max_size = max_size
+        # Number of requests served from the cache and number of
+        # coroutines executed.
+        self.hits = 0
+        self.misses = 0
+        # Executions are asyncio tasks bound to an event loop, so keep
+        # them separately for each event loop.
+        # {event_loop: OrderedDict({key: (expires_at, task), ...}), ...}
+        self._results_by_loop: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    async def get_or_execute(self, key: Hashable, execute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result stored under the key or `execute` it.
+
+        Args:
+            key: Identity of the result.
+            execute: Coroutine function producing the result.
+        """
+        loop = asyncio.get_running_loop()
+        results = self._results_by_loop.setdefault(loop, collections.OrderedDict())
+        now = loop.time()
+
+        # Results are ordered by the expiration time, so the expired
+        # ones are at the beginning.
+        while results:
+            expires_at, _ = next(iter(results.values()))
+            if expires_at > now:
+                break
+            results.popitem(last=False)
+
+        entry = results.get(key)
+        if entry is None:
+            self.misses += 1
+            task: Any = asyncio.ensure_future(execute())
+            # Retrieve the exception in case all the tasks waiting for
+            # the result are gone, so asyncio does not complain.
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            results[key] = (now + self.ttl, task)
+            while len(results) > self.max_size:
+                results.popitem(last=False)
+        else:
+            self.hits += 1
+            task = entry[1]
+
+        return await asyncio.shield(task)
+
+    def clear(self):
+        """Drop all the results and reset the counters."""
+        self._results_by_loop.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class NotificationResultCache(SharedResultCache):
+    """Results of subscription notifications shared by subscribers.
+
+    A broadcast to a busy group reaches every consumer holding a
+    subscription in that group, and each of them executes the same
+    document with the same payload. The cache lets the first subscriber
+    execute the notification and all the others of the process reuse
+    the result, so the notification processing cost grows with the
+    number of distinct subscription documents rather than with the
+    number of subscribers. The default `ttl` is enough for all the
+    consumers of the process to receive the broadcast.
+
+    NOTE: The cache is safe to use only for results which do not
+    depend on the subscriber, see `Subscription.share_notification_results`.
+    """
+
+
+class PayloadCache(SharedResultCache):
+    """Deserialized broadcast payloads shared by subscribers.
+
+    The serialized payload of a broadcast is delivered to every consumer
+    holding a subscription in the group. The cache lets the process
+    deserialize it once, which matters most for payloads with Django
+    models deserialized by `django.core.serializers`. Payloads are
+    keyed by their serialized bytes.
+
+    NOTE: All the subscribers receive the same deserialized object, so
+    `publish` must not modify the payload.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_size: int = 256):
+        """Create an empty cache."""
+        super().__init__(ttl=ttl, max_size=max_size)
+        self._deserialize = channels.db.database_sync_to_async(Serializer.deserialize, thread_sensitive=False)
+
+    async def deserialize(self, serialized_payload: bytes) -> Any:
+        """Deserialize the payload, unless it is in the cache already."""
+        return await self.get_or_execute(serialized_payload, lambda: self._deserialize(serialized_payload))
+
+
+# The caches shared by default by all the consumers of the process.
+notification_result_cache = NotificationResultCache()
+payload_cache = PayloadCache()
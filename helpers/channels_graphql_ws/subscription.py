@@ -27,8 +27,15 @@ from the Graphene (`graphene/types/mutation.py`).
 
 import asyncio
 import collections
+import functools
 import hashlib
 import logging
+import re
+import threading
+import zlib
+from typing import Any
+from typing import Callable
+from typing import Hashable
 from typing import Optional
 
 import asgiref.sync
@@ -147,6 +154,7 @@ class Subscription(graphene.ObjectType):
 
     Static methods of subscription subclass:
         broadcast(): Call this to notify all subscriptions in the group.
+        broadcast_many(): Call this to send many notifications at once.
         unsubscribe(): Call this to stop all subscriptions in the group.
 
     NOTE: If you call any of these methods from the asynchronous context
@@ -162,6 +170,54 @@ class Subscription(graphene.ObjectType):
     # Useful to skip intermediate notifications, e.g. progress reports.
     notification_queue_limit: Optional[int] = None
 
+    # What to do when the notification queue of a slow client
+    # overflows, see
+    # `GraphqlWsConsumer.subscription_notification_overflow_policy`.
+    # `None` means the policy of the consumer.
+    notification_overflow_policy: Optional[str] = None
+
+    # Set to `True` when the notification result does not depend on the
+    # subscriber (e.g. on the user in `info.context`), but only on the
+    # subscription document, its variables and the broadcast payload.
+    # Then subscribers of the process with the same document and
+    # variables share a single execution of `publish` per notification.
+    # NOTE: The `info.context` of the shared execution is the context of
+    # one of the subscribers.
+    share_notification_results: bool = False
+
+    # Minimal interval (in seconds) between two notifications delivered
+    # to a subscriber. Notifications which come in between are coalesced
+    # according to `notification_coalesce_mode` and delivered when the
+    # interval elapses. Useful to keep bursts (e.g. typing indicators)
+    # from flooding slow clients. `None` delivers notifications as soon
+    # as they come.
+    notification_coalesce_window: Optional[float] = None
+
+    # How the notifications coalesced within the window are delivered:
+    # "latest" - only the latest notification is delivered, or the
+    #   latest one per key when `notification_coalesce_key` is set;
+    # "batch" - all the notifications are delivered at once, `publish`
+    #   receives the list of their payloads instead of a payload.
+    notification_coalesce_mode: str = "latest"
+
+    # Function `(payload) -> key` to keep the latest notification per
+    # key in the "latest" mode. Define it as a `staticmethod`.
+    notification_coalesce_key: Optional[Callable[[Any], Hashable]] = None
+
+    # How the names of Channels groups are made from the subscription
+    # class and the group:
+    # "sha256" - SHA-256 hash of the class name and the group;
+    # "short" - the class name and the group as is when it is a valid
+    #   Channels group name, otherwise their 64-bit non-cryptographic
+    #   hash checked for collisions within the process.
+    # NOTE: All the processes must use the same scheme, otherwise they
+    # do not receive notifications of each other.
+    group_name_scheme: str = "sha256"
+
+    # Maximum number of payloads `broadcast_many` puts into a single
+    # message sent to a Channels group.
+    broadcast_batch_size: int = 100
+
     @classmethod
     def broadcast(cls, *, group=None, payload=None):
         """Call this method to notify all subscriptions in the group.
@@ -228,6 +284,67 @@ class Subscription(graphene.ObjectType):
             },
         )
 
+    @classmethod
+    def broadcast_many(cls, items):
+        """Call this method to send many notifications at once.
+
+        The same as calling `broadcast` for each item, but all the
+        payloads are serialized in one pass and the payloads of the same
+        group are sent to the Channels group in batches, so importing a
+        backlog does not cost a channel layer round trip per
+        notification. Notifications of each group are delivered in the
+        order of `items`.
+
+        Can be called from both synchronous and asynchronous contexts.
+
+        It is necessary to `await` if called from the async context.
+
+        Args:
+            items: Iterable of `(group, payload)` pairs, see `broadcast`
+                for the meaning of `group` and `payload`.
+
+        """
+        try:
+            event_loop = asyncio.get_event_loop()
+        except RuntimeError:
+            pass
+        else:
+            if event_loop.is_running():
+                return event_loop.create_task(cls.broadcast_many_async(items))
+
+        return cls.broadcast_many_sync(items)
+
+    @classmethod
+    async def broadcast_many_async(cls, items):
+        """Broadcast many, asynchronous version."""
+        items = list(items)
+        # Serialize all the payloads within a single thread hop.
+        serialized_payloads = await channels.db.database_sync_to_async(cls._serialize_many, thread_sensitive=False)(payload for _, payload in items)
+
+        # Send the batches concurrently, NOTE: batches of the same group
+        # are sent one after another to keep notifications ordered.
+        group_send = cls._channel_layer().group_send
+
+        async def send_group_messages(messages):
+            for message in messages:
+                await group_send(group=message["group"], message=message)
+
+        await asyncio.gather(*[send_group_messages(messages) for messages in cls._batch_messages(items, serialized_payloads).values()])
+
+    @classmethod
+    def broadcast_many_sync(cls, items):
+        """Broadcast many, synchronous version."""
+        items = list(items)
+        serialized_payloads = cls._serialize_many(payload for _, payload in items)
+
+        async def send_messages(messages_by_group):
+            group_send = cls._channel_layer().group_send
+            for messages in messages_by_group.values():
+                for message in messages:
+                    await group_send(group=message["group"], message=message)
+
+        asgiref.sync.async_to_sync(send_messages)(cls._batch_messages(items, serialized_payloads))
+
     @classmethod
     def unsubscribe(cls, *, group=None):
         """Call this method to stop all subscriptions in the group.
@@ -337,6 +454,13 @@ class Subscription(graphene.ObjectType):
         assert publish is not None, (
             f"Subscription '{cls.__qualname__}' does not define a" " method 'publish'! All subscriptions must define" " 'publish' which processes GraphQL queries!"
         )
+        assert cls.notification_overflow_policy in (None, "drop_oldest", "latest_only", "gap_marker", "disconnect"), (
+            f"Subscription '{cls.__qualname__}' has unknown" f" notification overflow policy '{cls.notification_overflow_policy}'!"
+        )
+        assert cls.group_name_scheme in ("sha256", "short"), f"Subscription '{cls.__qualname__}' has unknown group name scheme '{cls.group_name_scheme}'!"
+        assert cls.notification_coalesce_mode in ("latest", "batch"), (
+            f"Subscription '{cls.__qualname__}' has unknown" f" notification coalesce mode '{cls.notification_coalesce_mode}'!" " Expected 'latest' or 'batch'."
+        )
 
         if _meta.fields:
             _meta.fields.update(fields)
@@ -357,18 +481,43 @@ class Subscription(graphene.ObjectType):
 
     @classmethod
     def _group_name(cls, group=None):
-        """Group name based on the name of the subscription class."""
-        suffix = f"{cls.__module__}.{cls.__qualname__}"
-        if group is not None:
-            suffix += "-" + group
+        """Group name based on the name of the subscription class.
 
-        # Wrap the suffix into SHA256 to guarantee that the length of
-        # the group name is limited. Otherwise Channels will complain
-        # about that the group name is wrong (actually is too long).
-        suffix_sha256 = hashlib.sha256()
-        suffix_sha256.update(suffix.encode("utf-8"))
+        Names are memoized, so the hash is computed once per class and
+        group.
+        """
+        return _make_group_name(cls, group, GraphqlWsConsumer.group_name_prefix)
 
-        return f"{GraphqlWsConsumer.group_name_prefix}-{suffix_sha256.hexdigest()}"
+    @staticmethod
+    def _serialize_many(payloads):
+        """Serialize the payloads to send them to the Channels groups."""
+        return [Serializer.serialize(payload) for payload in payloads]
+
+    @classmethod
+    def _batch_messages(cls, items, serialized_payloads):
+        """Group serialized payloads into the Channels messages.
+
+        Returns dict `{group_name: [message, ...]}`. A single payload of
+        the group is sent as the regular `broadcast` message, several
+        ones are sent in the `broadcast_batch` messages of at most
+        `broadcast_batch_size` payloads each.
+        """
+        payloads_by_group = collections.defaultdict(list)
+        for (group, _), serialized_payload in zip(items, serialized_payloads):
+            payloads_by_group[cls._group_name(group)].append(serialized_payload)
+
+        messages_by_group = {}
+        for group, payloads in payloads_by_group.items():
+            if len(payloads) == 1:
+                # Will result in a call of `GraphqlWsConsumer.broadcast`.
+                messages_by_group[group] = [{"type": "broadcast", "group": group, "payload": payloads[0]}]
+                continue
+            # Will result in a call of `GraphqlWsConsumer.broadcast_batch`.
+            messages_by_group[group] = [
+                {"type": "broadcast_batch", "group": group, "payloads": payloads[start : start + cls.broadcast_batch_size]}
+                for start in range(0, len(payloads), cls.broadcast_batch_size)
+            ]
+        return messages_by_group
 
     @classmethod
     def _channel_layer(cls):
@@ -388,3 +537,58 @@ class SubscriptionOptions(graphene.types.objecttype.ObjectTypeOptions):
     subscribe = None
     publish = None
     unsubscribed = None
+
+
+# Group names valid for Channels, see `channels.layers.BaseChannelLayer`.
+_VALID_GROUP_NAME = re.compile(r"^[a-zA-Z\d\-_.]{1,99}$")
+
+# Number of group names memoized by `_make_group_name`.
+_GROUP_NAMES_CACHE_SIZE = 65536
+
+# Suffixes of the latest group names made by the "short" scheme from
+# the hash, used to detect their collisions. The registry is bounded
+# like the memoization of `_make_group_name`, so collisions are only
+# detected between the `_GROUP_NAMES_CACHE_SIZE` most recently hashed
+# groups of the process.
+_short_group_name_suffixes: collections.OrderedDict = collections.OrderedDict()  # {'<group name>': '<suffix>', ...}
+_short_group_name_suffixes_lock = threading.Lock()
+
+
+class GroupNameCollision(RuntimeError):
+    """Two groups got the same name from the "short" scheme."""
+
+
+@functools.lru_cache(maxsize=_GROUP_NAMES_CACHE_SIZE)
+def _make_group_name(subscription_class, group, prefix):
+    """Make the Channels group name, see `Subscription._group_name`."""
+    suffix = f"{subscription_class.__module__}.{subscription_class.__qualname__}"
+    if group is not None:
+        suffix += "-" + group
+
+    if subscription_class.group_name_scheme == "short":
+        # NOTE: Neither module nor class names contain "-", so the
+        # literal names are unique. They contain ".", so they never
+        # collide with the hash based ones.
+        name = f"{prefix}-{suffix}"
+        if _VALID_GROUP_NAME.match(name):
+            return name
+        encoded_suffix = suffix.encode("utf-8")
+        name = f"{prefix}-{zlib.crc32(encoded_suffix):08x}{zlib.adler32(encoded_suffix):08x}"
+        # Unlike SHA256 collisions of the short hash are possible, so
+        # rather fail loudly than mix notifications of two groups.
+        with _short_group_name_suffixes_lock:
+            colliding_suffix = _short_group_name_suffixes.setdefault(name, suffix)
+            _short_group_name_suffixes.move_to_end(name)
+            while len(_short_group_name_suffixes) > _GROUP_NAMES_CACHE_SIZE:
+                _short_group_name_suffixes.popitem(last=False)
+        if colliding_suffix != suffix:
+            raise GroupNameCollision(f"Group names of '{colliding_suffix}' and '{suffix}' collide! Use the 'sha256' group name scheme.")
+        return name
+
+    # Wrap the suffix into SHA256 to guarantee that the length of
+    # the group name is limited. Otherwise Channels will complain
+    # about that the group name is wrong (actually is too long).
+    suffix_sha256 = hashlib.sha256()
+    suffix_sha256.update(suffix.encode("utf-8"))
+
+    return f"{prefix}-{suffix_sha256.hexdigest()}"
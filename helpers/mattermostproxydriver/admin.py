@@ -1,7 +1,10 @@
 import re
+import threading
 
 from django.conf import settings
 
+from helpers.mattermostproxydriver.index import identifier_index
+from helpers.mattermostproxydriver.pool import create_driver
 from helpers.mattermostproxydriver.user import MattermostUserProxy
 
 
@@ -19,6 +22,9 @@ class MattermostAdminProxy(MattermostUserProxy):
         password (str): The password for authenticating with the Mattermost server.
 
     Methods:
+        shared: Returns the process-wide admin proxy shared by all threads of the worker.
+        validate_user_data: Validates the password, username and email of a new user.
+        validate_team_name: Validates the name of a new team.
         create_user: Creates a new user on the Mattermost server with validation of password.
         remove_user: Removes a user from the Mattermost server based on their identifier.
         deactivate_user: Deactivates a user's account on the Mattermost server.
@@ -33,25 +39,64 @@ class MattermostAdminProxy(MattermostUserProxy):
         remove_channel: Removes a specified channel from a team.
     """
 
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the process-wide admin proxy, logging the admin account in on the first call only.
+        The proxy is safe to use from several threads: its connections come from a bounded keep-alive pool
+        and an expired admin token is refreshed transparently.
+        """
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    driver = create_driver(
+                        login_id=settings.MATTERMOST_SERVER["admin_login_id"],
+                        password=settings.MATTERMOST_SERVER["admin_password"],
+                        base_url=settings.MATTERMOST_SERVER["server_URL"],
+                        pool_maxsize=settings.MATTERMOST_SESSION_POOL["admin_pool_maxsize"],
+                    )
+                    cls._shared = cls(driver=driver)
+        return cls._shared
+
+    @staticmethod
+    def validate_user_data(user_data):
+        """
+        Validates the password, username and email of a new user, raising an exception on invalid data.
+        """
+        password_pattern = r"^(?=.*[A-Z])(?=.*[a-z])(?=.*[0-9])(?=.*\W).{10,}$"
+        if re.match(password_pattern, user_data.get("password")) is None:
+            raise Exception("password should at least 10 chars including uppers, lowers, numbers and symbols")
+
+        username_pattern = r"^[a-z][a-z0-9._-]{2,21}$"
+        if re.fullmatch(username_pattern, user_data.get("username")) is None:
+            raise Exception("Username must begin with a letter, and contain between 3 to 22 lowercase characters made up of numbers, letters, and the symbols")
+
+        email_pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
+        if re.fullmatch(email_pattern, user_data.get("email")) is None:
+            raise Exception("Invalid email address")
+
+    @staticmethod
+    def validate_team_name(team_name):
+        """
+        Validates the name of a new team, raising an exception on an invalid name.
+        """
+        team_name_pattern = r"[^A-Za-z0-9-]"
+        if re.search(team_name_pattern, team_name):
+            raise Exception("Team name could not contains symbols or underscores.")
+
     def create_user(self, user_data, exception=True):
         """
         Creates a new user on the Mattermost server with the provided user data.
         Validates the password to meet certain criteria.
         """
         try:
-            password_pattern = r"^(?=.*[A-Z])(?=.*[a-z])(?=.*[0-9])(?=.*\W).{10,}$"
-            if re.match(password_pattern, user_data.get("password")) is None:
-                raise Exception("password should at least 10 chars including uppers, lowers, numbers and symbols")
-
-            username_pattern = r"^[a-z][a-z0-9._-]{2,21}$"
-            if re.fullmatch(username_pattern, user_data.get("username")) is None:
-                raise Exception("Username must begin with a letter, and contain between 3 to 22 lowercase characters made up of numbers, letters, and the symbols")
-
-            email_pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-            if re.fullmatch(email_pattern, user_data.get("email")) is None:
-                raise Exception("Invalid email address")
+            self.validate_user_data(user_data)
 
             response = self.driver.users.create_user(user_data)
+            identifier_index.invalidate("users")
             if response.get("id", False):
                 return {"name": response["username"], "id": response["id"]}
             return False
@@ -138,6 +183,7 @@ class MattermostAdminProxy(MattermostUserProxy):
                 raise Exception("User identifier not found.")
 
             response = self.driver.channels.add_user(channel_id=channel_id, options={"user_id": user_id})
+            identifier_index.invalidate("channels", team_id)
             return response is not None
         except Exception as e:
             if exception:
@@ -150,15 +196,14 @@ class MattermostAdminProxy(MattermostUserProxy):
         Validates the team name to ensure it meets certain criteria.
         """
         try:
-            team_name_pattern = r"[^A-Za-z0-9-]"
-            if re.search(team_name_pattern, team_name):
-                raise Exception("Team name could not contains symbols or underscores.")
+            self.validate_team_name(team_name)
 
             if self._find_team_id(identifier=team_name) is not None:
                 raise Exception("Team is already exist.")
 
             data = {"name": team_name, "display_name": team_name, "type": "O"}
             response = self.driver.teams.create_team(options=data)
+            identifier_index.invalidate("teams")
             return "id" in response
         except Exception as e:
             if exception:
@@ -180,6 +225,7 @@ class MattermostAdminProxy(MattermostUserProxy):
 
             data = {"team_id": team_id, "user_id": user_id}
             response = self.driver.teams.add_user_to_team(team_id, options=data)
+            identifier_index.invalidate("teams")
             return response is not None
         except Exception as e:
             if exception:
@@ -196,6 +242,8 @@ class MattermostAdminProxy(MattermostUserProxy):
                 raise Exception("Team identifier not found.")
 
             response = self.driver.teams.delete_team(team_id=team_id, params={"permanent": True})
+            identifier_index.invalidate("teams")
+            identifier_index.invalidate("channels", team_id)
             return response["status"] == "OK"
         except Exception as e:
             if exception:
@@ -218,6 +266,7 @@ class MattermostAdminProxy(MattermostUserProxy):
 
             data = {"team_id": team_id, "name": channel_name, "display_name": channel_name, "type": "O"}
             response = self.driver.channels.create_channel(data)
+            identifier_index.invalidate("channels", team_id)
             return response["id"]
         except Exception as e:
             if exception:
@@ -238,6 +287,7 @@ class MattermostAdminProxy(MattermostUserProxy):
                 raise Exception("Channel identifier not found.")
 
             response = self.driver.channels.delete_channel(channel_id)
+            identifier_index.invalidate("channels", team_id)
             return response["status"] == "OK"
         except Exception as e:
             if exception:
@@ -0,0 +1,261 @@
+import asyncio
+
+from django.conf import settings
+
+from helpers.mattermostproxydriver.admin import MattermostAdminProxy
+from helpers.mattermostproxydriver.async_pool import async_session_pool
+from helpers.mattermostproxydriver.async_user import AsyncMattermostUserProxy
+from helpers.mattermostproxydriver.index import identifier_index
+
+
+class AsyncMattermostAdminProxy(AsyncMattermostUserProxy):
+    """
+    An asyncio subclass of AsyncMattermostUserProxy that provides the administrative functionalities of MattermostAdminProxy.
+
+    Inherits Args from AsyncMattermostUserProxy:
+        client (AsyncMattermostClient): A logged in asyncio client.
+
+    Methods:
+        shared: Returns the admin proxy shared by all the tasks of the running event loop.
+        create_user: Creates a new user on the Mattermost server with validation of password.
+        deactivate_user: Deactivates a user's account on the Mattermost server.
+        activate_user: Reactivates a deactivated user's account on the Mattermost server.
+        list_all_teams: Lists all teams available on the Mattermost server.
+        list_all_public_channels: Lists all public channels for a specified team.
+        add_user_to_channel: Adds a user to a specified channel within a specified team.
+        create_join_team: Creates a new team with the specified name and joins the authenticated user.
+        add_user_to_team: Adds a user to a specified team.
+        remove_team: Removes a specified team from the Mattermost server.
+        create_join_channel: Creates a new channel within a specified team.
+        remove_channel: Removes a specified channel from a team.
+    """
+
+    @classmethod
+    async def shared(cls):
+        """
+        Returns the admin proxy shared by all the tasks of the running event loop, logging the admin account in on the first call only.
+        """
+        client = await async_session_pool.get(
+            login_id=settings.MATTERMOST_SERVER["admin_login_id"],
+            password=settings.MATTERMOST_SERVER["admin_password"],
+            base_url=settings.MATTERMOST_SERVER["server_URL"],
+            limit=settings.MATTERMOST_SESSION_POOL["admin_pool_maxsize"],
+        )
+        return cls(client)
+
+    async def create_user(self, user_data, exception=True):
+        """
+        Creates a new user on the Mattermost server with the provided user data.
+        Validates the password to meet certain criteria.
+        """
+        try:
+            MattermostAdminProxy.validate_user_data(user_data)
+
+            response = await self.client.post("/users", options=user_data)
+            identifier_index.invalidate("users")
+            if response.get("id", False):
+                return {"name": response["username"], "id": response["id"]}
+            return False
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def deactivate_user(self, user_identifier, exception=True):
+        """
+        Deactivates a user's account on the Mattermost server.
+        """
+        try:
+            user_id = await self._find_user_id_or_name(user_identifier) if not user_identifier.isdigit() else user_identifier
+            if user_id is None:
+                raise Exception("User identifier not found.")
+
+            response = await self.client.delete(f"/users/{user_id}")
+            return response["status"] == "OK"
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def activate_user(self, user_identifier, exception=True):
+        """
+        Reactivates a deactivated user's account on the Mattermost server.
+        """
+        try:
+            user_id = await self._find_user_id_or_name(user_identifier) if not user_identifier.isdigit() else user_identifier
+            if user_id is None:
+                raise Exception("User identifier not found.")
+
+            response = await self.client.put(f"/users/{user_id}/active", options={"active": True})
+            return response["status"] == "OK"
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def list_all_teams(self, exception=True):
+        """
+        Lists all teams available on the Mattermost server.
+        """
+        try:
+            teams = await self.client.get("/teams")
+            return [{"name": team["name"], "id": team["id"]} for team in teams]
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def list_all_public_channels(self, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Lists all public channels for a specified team.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier) if not team_identifier.isdigit() else team_identifier
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channels = await self.client.get(f"/teams/{team_id}/channels")
+            return [{"team_name": team_identifier, "name": channel["name"], "id": channel["id"]} for channel in channels if channel["display_name"]]
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def add_user_to_channel(self, channel_identifier, user_identifier, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Adds a user to a specified channel within a specified team.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier) if not team_identifier.isdigit() else team_identifier
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            # The channel and the user do not depend on each other, so they are resolved concurrently.
+            channel_id, user_id = await asyncio.gather(
+                self._find_channel_id(team_id, channel_identifier) if not channel_identifier.isdigit() else self._identity(channel_identifier),
+                self._find_user_id_or_name(user_identifier) if not user_identifier.isdigit() else self._identity(user_identifier),
+            )
+            if channel_id is None:
+                raise Exception("Channel identifier not found.")
+            if user_id is None:
+                raise Exception("User identifier not found.")
+
+            response = await self.client.post(f"/channels/{channel_id}/members", options={"user_id": user_id})
+            identifier_index.invalidate("channels", team_id)
+            return response is not None
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def create_join_team(self, team_name, exception=True):
+        """
+        Creates a new team with the specified name and automatically joins the authenticated user.
+        Validates the team name to ensure it meets certain criteria.
+        """
+        try:
+            MattermostAdminProxy.validate_team_name(team_name)
+
+            if await self._find_team_id(identifier=team_name) is not None:
+                raise Exception("Team is already exist.")
+
+            data = {"name": team_name, "display_name": team_name, "type": "O"}
+            response = await self.client.post("/teams", options=data)
+            identifier_index.invalidate("teams")
+            return "id" in response
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def add_user_to_team(self, user_identifier, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Adds a user to a specified team.
+        """
+        try:
+            team_id, user_id = await asyncio.gather(
+                self._find_team_id(team_identifier) if not team_identifier.isdigit() else self._identity(team_identifier),
+                self._find_user_id_or_name(user_identifier) if not user_identifier.isdigit() else self._identity(user_identifier),
+            )
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+            if user_id is None:
+                raise Exception("User identifier not found.")
+
+            data = {"team_id": team_id, "user_id": user_id}
+            response = await self.client.post(f"/teams/{team_id}/members", options=data)
+            identifier_index.invalidate("teams")
+            return response is not None
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def remove_team(self, team_identifier, exception=True):
+        """
+        Removes a specified team from the Mattermost server.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier) if not team_identifier.isdigit() else team_identifier
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            response = await self.client.delete(f"/teams/{team_id}", params={"permanent": True})
+            identifier_index.invalidate("teams")
+            identifier_index.invalidate("channels", team_id)
+            return response["status"] == "OK"
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def create_join_channel(self, channel_name, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Creates a new channel within a specified team and automatically joins the authenticated user.
+        Validates the channel name to ensure it meets certain criteria.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier) if not team_identifier.isdigit() else team_identifier
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channel_id = await self._find_channel_id(team_id=team_id, identifier=channel_name)
+            if channel_id:
+                raise Exception("Channel is already exist.")
+
+            data = {"team_id": team_id, "name": channel_name, "display_name": channel_name, "type": "O"}
+            response = await self.client.post("/channels", options=data)
+            identifier_index.invalidate("channels", team_id)
+            return response["id"]
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def remove_channel(self, channel_identifier, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Removes a specified channel from a specified team.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier) if not team_identifier.isdigit() else team_identifier
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channel_id = await self._find_channel_id(team_id, channel_identifier) if not channel_identifier.isdigit() else channel_identifier
+            if channel_id is None:
+                raise Exception("Channel identifier not found.")
+
+            response = await self.client.delete(f"/channels/{channel_id}")
+            identifier_index.invalidate("channels", team_id)
+            return response["status"] == "OK"
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    @staticmethod
+    async def _identity(value):
+        """
+        Returns the value as is, for identifiers given as IDs which need no lookup.
+        """
+        return value
@@ -0,0 +1,244 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+
+import aiohttp
+from django.conf import settings
+from mattermostdriver.exceptions import NoAccessTokenProvided
+
+from helpers.mattermostproxydriver.pool import ERRORS_BY_STATUS_CODE
+from helpers.mattermostproxydriver.pool import LOGIN_ENDPOINT
+
+
+class AsyncMattermostClient:
+    """
+    An asyncio client of the Mattermost API v4 built on aiohttp.
+
+    The client keeps its connections alive in an aiohttp session and raises the same exceptions as the
+    synchronous `mattermostdriver` client. When the server answers 401 (expired or revoked token), the
+    client logs in again once and retries the request.
+
+    Args:
+        login_id (str): Login ID for authenticating with the Mattermost server.
+        password (str): Password for authenticating with the Mattermost server.
+        base_url (str): Base URL (host name) of the Mattermost server.
+        limit (int): Maximum number of simultaneous connections to the server.
+        scheme (str): Scheme of the server URL, "https" or "http".
+        port (int): Port of the server.
+
+    Methods:
+        login: Logs in and remembers the token, user ID and username.
+        get, post, put, delete: Send a request to an API endpoint and return the decoded response body.
+        close: Closes the connections of the client.
+    """
+
+    def __init__(
+        self,
+        login_id,
+        password,
+        base_url,
+        limit=settings.MATTERMOST_SESSION_POOL["max_parallel_requests"],
+        scheme=settings.MATTERMOST_SERVER["scheme"],
+        port=settings.MATTERMOST_SERVER["port"],
+    ):
+        self.url = f"{scheme}://{base_url}:{port}/api/v4"
+        self.login_id = login_id
+        self.password = password
+        self.token = ""
+        self.userid = ""
+        self.username = ""
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit))
+        self._login_lock = asyncio.Lock()
+
+    async def login(self):
+        """
+        Logs in and remembers the token, user ID and username.
+        """
+        headers, result = await self._send("post", LOGIN_ENDPOINT, options={"login_id": self.login_id, "password": self.password, "token": None})
+        self.token = headers["Token"]
+        self.userid = result["id"]
+        self.username = result["username"]
+        return result
+
+    async def request(self, method, endpoint, options=None, params=None):
+        """
+        Sends a request, logging in again and retrying once on a 401 response.
+        """
+        token = self.token
+        try:
+            return (await self._send(method, endpoint, options=options, params=params))[1]
+        except NoAccessTokenProvided:
+            if endpoint == LOGIN_ENDPOINT:
+                raise
+
+            async with self._login_lock:
+                # Another task may have already refreshed the token.
+                if self.token == token:
+                    await self.login()
+
+            return (await self._send(method, endpoint, options=options, params=params))[1]
+
+    async def get(self, endpoint, params=None):
+        return await self.request("get", endpoint, params=params)
+
+    async def post(self, endpoint, options=None, params=None):
+        return await self.request("post", endpoint, options=options, params=params)
+
+    async def put(self, endpoint, options=None, params=None):
+        return await self.request("put", endpoint, options=options, params=params)
+
+    async def delete(self, endpoint, options=None, params=None):
+        return await self.request("delete", endpoint, options=options, params=params)
+
+    async def close(self):
+        """
+        Closes the connections of the client.
+        """
+        await self.session.close()
+
+    async def _send(self, method, endpoint, options=None, params=None):
+        """
+        Performs a single HTTP request and maps error responses to the driver exceptions.
+        Returns the response headers and the decoded body.
+        """
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        # Unlike requests, aiohttp does not accept booleans in query strings.
+        params = {key: str(value).lower() if isinstance(value, bool) else value for key, value in (params or {}).items()}
+
+        async with self.session.request(method, self.url + endpoint, json=options, params=params, headers=headers) as response:
+            if response.content_type == "application/json":
+                body = await response.json()
+            else:
+                body = await response.text()
+
+            if response.status >= 400:
+                exception_class = ERRORS_BY_STATUS_CODE.get(response.status)
+                if exception_class is None:
+                    response.raise_for_status()
+                raise exception_class(body.get("message", body) if isinstance(body, dict) else body)
+
+            return response.headers, body
+
+
+class AsyncMattermostSessionPool:
+    """
+    A pool of logged in asyncio Mattermost clients, the asyncio counterpart of `MattermostSessionPool`.
+
+    aiohttp sessions are bound to the event loop they were created in, so the pool keeps separate
+    sessions for each event loop. Concurrent requests of the same user on a pool miss share a single
+    login. Idle and least recently used clients are evicted and closed after a grace period, since a
+    task may still be using a client it has just received.
+
+    Args:
+        max_size (int): Maximum number of clients kept in the pool of each event loop.
+        idle_timeout (int): Number of seconds after which an unused client is evicted.
+        close_grace_period (int): Number of seconds an evicted client stays open before it is closed.
+
+    Methods:
+        get: Returns a logged in client for the given credentials, logging in only on a pool miss.
+        discard: Removes the client of the given login ID from the pool of the running event loop.
+    """
+
+    def __init__(
+        self,
+        max_size=settings.MATTERMOST_SESSION_POOL["max_size"],
+        idle_timeout=settings.MATTERMOST_SESSION_POOL["idle_timeout"],
+        close_grace_period=settings.MATTERMOST_SESSION_POOL["close_grace_period"],
+    ):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.close_grace_period = close_grace_period
+        self._close_tasks = set()
+        # {event_loop: OrderedDict({(base_url, login_id): (client_task, password, last_used), ...}), ...}
+        self._sessions_by_loop = weakref.WeakKeyDictionary()
+
+    async def get(self, login_id, password, base_url=settings.MATTERMOST_SERVER["server_URL"], limit=settings.MATTERMOST_SESSION_POOL["max_parallel_requests"]):
+        """
+        Returns a logged in client for the given credentials, logging in only on a pool miss.
+        """
+        sessions = self._sessions_by_loop.setdefault(asyncio.get_running_loop(), OrderedDict())
+        key = (base_url, login_id)
+        now = time.monotonic()
+        self._evict_idle(sessions, now)
+
+        session = sessions.get(key)
+        if session is None or session[1] != password or self._failed(session[0]):
+            if session is not None:
+                self._close(session[0])
+            client_task = asyncio.create_task(self._create_client(login_id, password, base_url, limit))
+            session = (client_task, password, now)
+        sessions[key] = (session[0], password, now)
+        sessions.move_to_end(key)
+
+        while len(sessions) > self.max_size:
+            _, (client_task, _, _) = sessions.popitem(last=False)
+            self._close(client_task)
+
+        return await asyncio.shield(session[0])
+
+    def discard(self, login_id, base_url=settings.MATTERMOST_SERVER["server_URL"]):
+        """
+        Removes the client of the given login ID from the pool of the running event loop.
+        """
+        sessions = self._sessions_by_loop.get(asyncio.get_running_loop(), {})
+        session = sessions.pop((base_url, login_id), None)
+        if session is not None:
+            self._close(session[0])
+
+    @staticmethod
+    async def _create_client(login_id, password, base_url, limit):
+        """
+        Creates and logs in a new client, closing it if the login fails.
+        """
+        client = AsyncMattermostClient(login_id=login_id, password=password, base_url=base_url, limit=limit)
+        try:
+            await client.login()
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    def _evict_idle(self, sessions, now):
+        """
+        Drops and closes clients which have not been used for `idle_timeout` seconds.
+        """
+        # Clients are ordered by the last use, so the idle ones are at the beginning.
+        while sessions:
+            key, (client_task, _, last_used) = next(iter(sessions.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            sessions.pop(key)
+            self._close(client_task)
+
+    @staticmethod
+    def _failed(client_task):
+        """
+        Tells whether the login of the client has failed.
+        """
+        return client_task.done() and (client_task.cancelled() or client_task.exception() is not None)
+
+    def _close(self, client_task):
+        """
+        Closes the client of an evicted session once its login is over, after `close_grace_period` seconds,
+        so the requests of the tasks which have just received the client from `get` can still complete.
+        """
+        client_task.add_done_callback(self._schedule_close)
+
+    def _schedule_close(self, client_task):
+        """
+        Schedules the close of a logged in client after the grace period. Clients whose login failed have nothing to close.
+        """
+        if not self._failed(client_task):
+            client_task.get_loop().call_later(self.close_grace_period, self._start_close, client_task.result())
+
+    def _start_close(self, client):
+        """
+        Starts closing the client, keeping a reference to the close task until it is done.
+        """
+        close_task = asyncio.ensure_future(client.close())
+        self._close_tasks.add(close_task)
+        close_task.add_done_callback(self._close_tasks.discard)
+
+
+async_session_pool = AsyncMattermostSessionPool()
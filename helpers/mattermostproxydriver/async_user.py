@@ -0,0 +1,309 @@
+import asyncio
+
+from django.conf import settings
+
+from helpers.mattermostproxydriver import common
+from helpers.mattermostproxydriver.async_pool import AsyncMattermostClient
+from helpers.mattermostproxydriver.async_pool import async_session_pool
+from helpers.mattermostproxydriver.index import identifier_index
+from helpers.mattermostproxydriver.index import user_profile_cache
+from helpers.mattermostproxydriver.message_cache import recent_message_cache
+
+
+class AsyncMattermostUserProxy:
+    """
+    An asyncio proxy class for interacting with a Mattermost server as a User.
+
+    This class has the same methods as MattermostUserProxy, implemented as coroutines on top of
+    AsyncMattermostClient, so the ASGI and WebSocket code paths can await Mattermost calls instead
+    of blocking a thread per call. Only the requests differ: formatting, pagination and the bookkeeping of
+    the in-process index and caches are shared with the synchronous proxy through `helpers.mattermostproxydriver.common`.
+
+    Args:
+        client (AsyncMattermostClient): A logged in asyncio client.
+
+    Methods:
+        login: Creates a proxy with a new logged in client.
+        from_user: Creates a proxy for a Django user, reusing the user's pooled client.
+        list_users: Lists all users from the Mattermost server.
+        list_related_teams: Lists teams related to the authenticated user.
+        list_related_channels: Lists channels related to a specific team, with an option to filter by the authenticated user.
+        join_to_channel: Joins the authenticated user to a specified channel.
+        leave_from_channel: Removes the authenticated user from a specified channel.
+        send_message: Sends a message to a specified channel.
+        get_messages: Retrieves messages from a specified channel, optionally converting timestamps to a given timezone.
+    """
+
+    convert_timestamp_to_iso = staticmethod(common.convert_timestamp_to_iso)
+
+    def __init__(self, client):
+        """
+        Initializes the AsyncMattermostUserProxy instance with a logged in client.
+        """
+        self.client = client
+        self.base_url = client.url
+        self.username = client.username
+        self.userid = client.userid
+
+    @classmethod
+    async def login(
+        cls,
+        login_id=settings.MATTERMOST_SERVER["admin_login_id"],
+        password=settings.MATTERMOST_SERVER["admin_password"],
+        base_url=settings.MATTERMOST_SERVER["server_URL"],
+    ):
+        """
+        Creates a proxy with a new logged in client. The caller is responsible for closing `proxy.client`.
+        """
+        client = AsyncMattermostClient(login_id=login_id, password=password, base_url=base_url)
+        await client.login()
+        return cls(client)
+
+    @classmethod
+    async def from_user(cls, user, base_url=settings.MATTERMOST_SERVER["server_URL"]):
+        """
+        Creates a proxy for a Django user, reusing the user's pooled client instead of logging in again.
+        """
+        client = await async_session_pool.get(login_id=user.username, password=user.password[:30], base_url=base_url)
+        return cls(client)
+
+    async def _find_item(self, key, fetch, identifier):
+        """
+        Searches for an item by ID or name in the cached listing stored under the key.
+        The listing is fetched from the server when it is not cached or does not contain the identifier.
+        """
+        item = common.find_indexed(key, identifier)
+        if item is None:
+            # The identifier may have been created after the listing was cached.
+            item = common.index_and_find(key, await fetch(), identifier)
+        return item
+
+    async def _find_by_id_or_name(self, key, fetch, identifier, find_name=False):
+        """
+        Searches for the ID (or the name) of an item by ID or name in the cached listing stored under the key.
+        """
+        return common.identifier_of(await self._find_item(key, fetch, identifier), find_name)
+
+    async def _find_user_id_or_name(self, identifier, find_name=False):
+        """
+        Finds a user ID based on a provided identifier (ID or username).
+        """
+        return await self._find_by_id_or_name(("users",), lambda: self.client.get("/users"), identifier, find_name=find_name)
+
+    async def _find_usernames(self, user_ids):
+        """
+        Resolves the usernames of the given user IDs, fetching the ones not cached yet with a single request.
+        """
+        usernames, missing = user_profile_cache.get_many(user_ids)
+        if missing:
+            usernames = common.cache_usernames(usernames, await self.client.post("/users/ids", options=missing))
+        return usernames
+
+    async def _find_channel(self, team_id, identifier):
+        """
+        Finds a channel the authenticated user belongs to within a specified team based on the channel identifier, or None.
+        """
+        return await self._find_item(("channels", team_id, self.userid), lambda: self._fetch_channels(team_id), identifier)
+
+    async def _find_channel_id(self, team_id, identifier):
+        """
+        Finds a channel ID within a specified team based on the channel identifier.
+        """
+        return common.identifier_of(await self._find_channel(team_id, identifier))
+
+    async def _find_team_id(self, identifier):
+        """
+        Finds a team ID based on a provided team identifier (ID or team name).
+        """
+        return await self._find_by_id_or_name(("teams", self.userid), lambda: self.client.get(f"/users/{self.userid}/teams"), identifier)
+
+    async def _fetch_channels(self, team_id):
+        """
+        Fetches the channels the authenticated user belongs to within a specified team.
+        """
+        return await self.client.get(f"/users/{self.userid}/teams/{team_id}/channels")
+
+    async def _list_channels(self, team_id):
+        """
+        Lists the channels the authenticated user belongs to within a specified team, using the cached listing if any.
+        """
+        channels = identifier_index.items(("channels", team_id, self.userid))
+        if channels is None:
+            channels = await self._fetch_channels(team_id)
+            identifier_index.put(("channels", team_id, self.userid), channels)
+        return channels
+
+    async def _format_posts(self, posts, time_zone=settings.TIME_ZONE, known_usernames=None):
+        """
+        Formats posts returned by the Mattermost server, resolving the usernames of all their authors at once.
+        Usernames of `known_usernames` (indexed by user ID) are not resolved again.
+        """
+        known_usernames = known_usernames or {}
+        usernames = {**known_usernames, **await self._find_usernames(common.post_authors(posts, known_usernames))}
+        return common.format_posts(posts, usernames, time_zone)
+
+    async def _get_last_messages(self, channels, time_zone=settings.TIME_ZONE):
+        """
+        Fetches the last message of each given channel concurrently, with a bounded number of requests in flight.
+        Channels without any post (according to their `last_post_at`) are not requested at all.
+        Returns a dict of formatted messages indexed by channel ID.
+        """
+        channel_ids = common.channels_with_posts(channels)
+        semaphore = asyncio.Semaphore(settings.MATTERMOST_SESSION_POOL["max_parallel_requests"])
+
+        async def fetch_last_post(channel_id):
+            async with semaphore:
+                return common.last_post(await self.client.get(f"/channels/{channel_id}/posts", params={"page": 0, "per_page": 1}))
+
+        last_posts = [post for post in await asyncio.gather(*[fetch_last_post(channel_id) for channel_id in channel_ids]) if post is not None]
+
+        return {post["channel_id"]: message for post, message in zip(last_posts, await self._format_posts(last_posts, time_zone))}
+
+    async def list_users(self):
+        """
+        Lists all users from the Mattermost server.
+        """
+        return common.format_users(await self.client.get("/users"))
+
+    async def list_related_teams(self):
+        """
+        Lists teams related to the authenticated user.
+        """
+        return common.format_teams(await self.client.get(f"/users/{self.userid}/teams"))
+
+    async def list_related_channels(self, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exclude_list=None, params=None, exception=True):
+        """
+        Lists channels related to a specific team, excluding those that contain any of the specified strings in the list,
+        with pagination. Each channel's data includes the last message of the channel.
+        """
+        team_id = await self._find_team_id(team_identifier)
+        if team_id is None:
+            if exception:
+                raise Exception("Team identifier not found.")
+            return False
+
+        paginated_channels, has_next = common.paginate_channels(await self._list_channels(team_id), exclude_list, params)
+
+        # Fetching the last messages of the requested channels only
+        last_messages = await self._get_last_messages(paginated_channels)
+
+        return common.format_channels(paginated_channels, team_identifier, last_messages), has_next
+
+    async def join_to_channel(self, channel_identifier, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Joins the authenticated user to a specified channel.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier)
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channel_id = await self._find_channel_id(team_id, channel_identifier)
+            if channel_id is None:
+                raise Exception("Channel identifier not found.")
+
+            response = await self.client.post(f"/channels/{channel_id}/members", options={"user_id": self.userid})
+            identifier_index.invalidate("channels", team_id)
+            return response is not None
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def leave_from_channel(self, channel_identifier, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
+        """
+        Removes the authenticated user from a specified channel.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier)
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channel_id = await self._find_channel_id(team_id, channel_identifier)
+            if channel_id is None:
+                raise Exception("Channel identifier not found.")
+
+            response = await self.client.delete(f"/channels/{channel_id}/members/{self.userid}")
+            identifier_index.invalidate("channels", team_id)
+            return response["status"] == "OK"
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def send_message(
+        self, channel_identifier, message, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], time_zone=settings.TIME_ZONE, props=None, exception=True
+    ):
+        """
+        Sends a message to a specified channel, with the given custom post properties if any.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier)
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channel_id = await self._find_channel_id(team_id, channel_identifier)
+            if channel_id is None:
+                raise Exception("Channel identifier not found.")
+
+            response = await self.client.post("/posts", options=common.make_post(channel_id, message, props))
+
+            # The post is made by the authenticated user, so the username is already known.
+            formatted_response = (await self._format_posts([response], time_zone, known_usernames={self.userid: self.username}))[0]
+
+            if common.caches_messages(time_zone):
+                await recent_message_cache.aadd(channel_id, formatted_response)
+
+            return formatted_response
+        except Exception as e:
+            if exception:
+                raise e
+            return False
+
+    async def get_messages(
+        self,
+        channel_identifier,
+        team_identifier=settings.MATTERMOST_SERVER["team_identifier"],
+        time_zone=settings.TIME_ZONE,
+        last_message=False,
+        params=None,
+        exception=True,
+    ):
+        """
+        Retrieves messages from a specified channel, optionally converting timestamps to a given timezone.
+        If 'last_message' is True, only the last message is returned.
+        """
+        try:
+            team_id = await self._find_team_id(team_identifier)
+            if team_id is None:
+                raise Exception("Team identifier not found.")
+
+            channel_id = await self._find_channel_id(team_id, channel_identifier)
+            if channel_id is None:
+                raise Exception("Channel identifier not found.")
+
+            # The first page of a channel whose last messages are cached is answered without a request.
+            page_size = common.cached_page_size(params, time_zone, last_message)
+            if page_size is not None:
+                cached_page = await recent_message_cache.aget(channel_id, page_size)
+                if cached_page is not None:
+                    return common.cached_messages_page(cached_page)
+
+            if last_message:
+                # Fetch only the last message
+                messages = await self.client.get(f"/channels/{channel_id}/posts", params={"page": 0, "per_page": 1})
+            else:
+                # Fetch all messages (or a specific page if pagination parameters are provided)
+                messages = await self.client.get(f"/channels/{channel_id}/posts", params=params)
+
+            # Formatting messages
+            formatted_messages = await self._format_posts(list(messages["posts"].values()), time_zone)
+
+            if page_size is not None:
+                await recent_message_cache.aseed(channel_id, formatted_messages, bool(messages["prev_post_id"]))
+
+            return common.messages_page(formatted_messages, messages)
+        except Exception as e:
+            if exception:
+                raise e
+            return [], False, False
@@ -0,0 +1,192 @@
+from datetime import datetime
+from itertools import islice
+
+import pytz
+from django.conf import settings
+
+from helpers.mattermostproxydriver.index import identifier_index
+from helpers.mattermostproxydriver.index import user_profile_cache
+from helpers.mattermostproxydriver.message_cache import recent_message_cache
+
+
+def convert_timestamp_to_iso(timestamp, tz_name):
+    """
+    Converts a timestamp to ISO format in a specified timezone.
+    """
+    utc_time = datetime.utcfromtimestamp(timestamp / 1000).replace(tzinfo=pytz.utc)
+    target_time = utc_time.astimezone(pytz.timezone(tz_name))
+    return target_time.isoformat()
+
+
+def find_indexed(key, identifier):
+    """
+    Returns the item of the cached listing stored under the key matching the identifier, or None.
+    """
+    indexed = identifier_index.get(key)
+    return indexed.get(identifier) if indexed is not None else None
+
+
+def index_and_find(key, listing, identifier):
+    """
+    Indexes the listing freshly fetched from the server under the key and returns its item matching the identifier, or None.
+    """
+    return identifier_index.put(key, listing).get(identifier)
+
+
+def identifier_of(item, find_name=False):
+    """
+    Returns the name (or username) of the item if `find_name` is True, its ID otherwise.
+    """
+    if item is None:
+        return None
+    if find_name:
+        return item.get("username") if "username" in item else item.get("id")
+    else:
+        return item.get("id") if "id" in item else item.get("username")
+
+
+def cache_usernames(usernames, profiles):
+    """
+    Caches the usernames of the user profiles fetched from the server and adds them to `usernames`, which is returned.
+    """
+    user_profile_cache.put_many(profiles)
+    usernames.update({profile["id"]: profile["username"] for profile in profiles})
+    return usernames
+
+
+def post_authors(posts, known_usernames):
+    """
+    Returns the IDs of the authors of the posts whose usernames are not known yet.
+    """
+    return [post["user_id"] for post in posts if post["user_id"] not in known_usernames]
+
+
+def format_posts(posts, usernames, time_zone=settings.TIME_ZONE):
+    """
+    Formats posts returned by the Mattermost server, with the usernames of their authors indexed by user ID.
+    """
+    return [
+        {
+            "message": post["message"],
+            "create_at": convert_timestamp_to_iso(post["create_at"], time_zone) if time_zone else post["create_at"],
+            "user_id": post["user_id"],
+            "username": usernames.get(post["user_id"]),
+            "id": post["id"],
+            "type": post["type"] if post["type"] else "str",
+        }
+        for post in posts
+    ]
+
+
+def channels_with_posts(channels):
+    """
+    Returns the IDs of the channels which have posts according to their `last_post_at`.
+    """
+    return [channel["id"] for channel in channels if channel.get("last_post_at", 1)]
+
+
+def last_post(page):
+    """
+    Returns the last post of a page of posts, or None if the page is empty.
+    """
+    return page["posts"][page["order"][0]] if page["order"] else None
+
+
+def format_users(users):
+    """
+    Formats the users returned by the Mattermost server.
+    """
+    return [{"name": user["username"], "id": user["id"]} for user in users]
+
+
+def format_teams(teams):
+    """
+    Formats the teams returned by the Mattermost server.
+    """
+    return [{"name": team["name"], "id": team["id"]} for team in teams]
+
+
+def paginate_channels(channels, exclude_list, params):
+    """
+    Filters the channels, excluding the unnamed ones and those whose name contains any of the strings of the list,
+    and takes the requested page. Returns the channels of the page and whether there is a next page.
+    """
+    # Converting all strings in the exclude list to lowercase for case-insensitive comparison
+    exclude_list = [str.lower() for str in exclude_list or []]
+
+    # Filtering channels lazily, so only the requested window is ever materialized
+    filtered_channels = (channel for channel in channels if channel["display_name"] and not any(exclude_str in channel["name"].lower() for exclude_str in exclude_list))
+
+    # Pagination
+    if params.get("page", False) and params.get("per_page", False):
+        page_number = int(params.get("page"))
+        page_size = int(params.get("per_page"))
+        if page_number < 1 or page_size < 1:
+            raise Exception("Page number and page size must be positive.")
+        start_index = (page_number - 1) * page_size
+        end_index = start_index + page_size
+
+        # Taking the requested page plus one channel of lookahead to determine if there is a next page
+        paginated_channels = list(islice(filtered_channels, start_index, end_index + 1))
+        return paginated_channels[:page_size], len(paginated_channels) > page_size
+
+    return list(filtered_channels), False
+
+
+def format_channels(channels, team_identifier, last_messages):
+    """
+    Formats the channels of a page, including the last message of each channel.
+    """
+    return [
+        {
+            "team_name": team_identifier,
+            "name": channel["name"],
+            "id": channel["id"],
+            "last_message": last_messages.get(channel["id"]),  # Including the last message in the channel data
+        }
+        for channel in channels
+    ]
+
+
+def make_post(channel_id, message, props=None):
+    """
+    Makes the body of a new post, with the given custom post properties if any.
+    """
+    post = {"channel_id": channel_id, "message": message}
+    if props:
+        post["props"] = props
+    return post
+
+
+def caches_messages(time_zone):
+    """
+    Tells whether messages formatted in the time zone are kept in the recent message cache.
+    """
+    return recent_message_cache is not None and time_zone == settings.TIME_ZONE
+
+
+def cached_page_size(params, time_zone, last_message):
+    """
+    Returns the page size of a request for the first page of messages which the recent message cache can answer, or None.
+    """
+    if not caches_messages(time_zone) or last_message or params is None:
+        return None
+    if int(params.get("page", 0)) != 0:
+        return None
+    page_size = int(params.get("per_page", 60))
+    return page_size if 0 < page_size <= recent_message_cache.max_messages else None
+
+
+def messages_page(formatted_messages, page):
+    """
+    Makes the result of `get_messages` out of the formatted messages of a page of posts.
+    """
+    return formatted_messages, bool(page["prev_post_id"]), bool(page["next_post_id"])
+
+
+def cached_messages_page(cached_page):
+    """
+    Makes the result of `get_messages` out of a first page answered by the recent message cache.
+    """
+    messages, has_previous = cached_page
+    return messages, has_previous, False
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MattermostEventStream:
+    """
+    A resumable stream of the events of the Mattermost WebSocket API (`/api/v4/websocket`).
+
+    The stream keeps a single WebSocket connection authenticated with the token of the client and
+    reconnects when it breaks, waiting `reconnect_delay` seconds doubled after every failed attempt up to
+    `max_reconnect_delay`. When the token is rejected, the client logs in again before waiting. A reconnection
+    passes the ID of the previous connection and the next expected sequence number, so the server replays
+    the events missed in between. When the server cannot resume (it answers with a new connection ID) or a
+    sequence number is skipped, the gap is logged and counted in `missed_event_gaps`: the events of the gap
+    are lost. Malformed frames are logged and skipped.
+
+    Args:
+        client (AsyncMattermostClient): A logged in asyncio client, the events visible to its user are streamed.
+        reconnect_delay (float): Number of seconds to wait before the first reconnection attempt.
+        max_reconnect_delay (float): Maximum number of seconds to wait between reconnection attempts.
+        heartbeat (float): Number of seconds between the ping frames keeping the connection alive.
+
+    Methods:
+        __aiter__: Yields the events (decoded dicts with the `event`, `data`, `broadcast` and `seq` keys) until closed.
+        close: Stops the stream and closes its connection.
+    """
+
+    def __init__(
+        self,
+        client,
+        reconnect_delay=settings.MATTERMOST_EVENTS["reconnect_delay"],
+        max_reconnect_delay=settings.MATTERMOST_EVENTS["max_reconnect_delay"],
+        heartbeat=settings.MATTERMOST_EVENTS["heartbeat"],
+    ):
+        self.client = client
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.heartbeat = heartbeat
+        self.connection_id = ""
+        self.sequence = 0  # The sequence number of the next expected event.
+        self.missed_event_gaps = 0
+        self._websocket = None
+        self._closed = False
+
+    @property
+    def url(self):
+        """
+        The URL of the WebSocket API, with the resumption parameters once a connection has been established.
+        """
+        # The client URL is `http(s)://<server>/api/v4`.
+        url = "ws" + self.client.url[len("http") :] + "/websocket"
+        if self.connection_id:
+            url += f"?connection_id={self.connection_id}&sequence_number={self.sequence}"
+        return url
+
+    async def __aiter__(self):
+        delay = self.reconnect_delay
+        while not self._closed:
+            try:
+                async with self.client.session.ws_connect(self.url, headers={"Authorization": f"Bearer {self.client.token}"}, heartbeat=self.heartbeat) as websocket:
+                    self._websocket = websocket
+                    async for message in websocket:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        try:
+                            event = json.loads(message.data)
+                        except ValueError:
+                            logger.warning("Malformed Mattermost event skipped: %.200r.", message.data)
+                            continue
+                        # Replies to actions sent by the client carry `seq_reply` instead of an event.
+                        if "event" not in event:
+                            continue
+                        self._track_sequence(event)
+                        delay = self.reconnect_delay
+                        yield event
+            except aiohttp.WSServerHandshakeError as e:
+                if e.status != 401:
+                    logger.warning("Connection to the Mattermost WebSocket API refused: %s.", e)
+                else:
+                    # The token expired or was revoked, the next attempt uses a new one.
+                    try:
+                        await self.client.login()
+                    except Exception as e:
+                        logger.warning("Login to the Mattermost server failed: %s.", e)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Connection to the Mattermost WebSocket API failed: %r.", e)
+            finally:
+                self._websocket = None
+
+            if not self._closed:
+                logger.info("Reconnecting to the Mattermost WebSocket API in %s seconds.", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def close(self):
+        """
+        Stops the stream and closes its connection.
+        """
+        self._closed = True
+        if self._websocket is not None:
+            await self._websocket.close()
+
+    def _track_sequence(self, event):
+        """
+        Remembers the connection ID and the sequence number of the next expected event, logging the gaps.
+        """
+        if event["event"] == "hello":
+            connection_id = event["data"].get("connection_id", "")
+            if self.connection_id and connection_id != self.connection_id:
+                self._missed_events(f"the connection {self.connection_id} could not be resumed")
+            self.connection_id = connection_id
+        elif event.get("seq") != self.sequence:
+            self._missed_events(f"expected the event {self.sequence}, got {event.get('seq')}")
+        self.sequence = event.get("seq", self.sequence) + 1
+
+    def _missed_events(self, reason):
+        """
+        Counts and logs a gap in the stream.
+        """
+        self.missed_event_gaps += 1
+        logger.warning("Mattermost events were missed: %s.", reason)
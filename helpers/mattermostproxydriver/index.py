@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class MattermostIdentifierIndex:
+    """
+    An in-process index resolving Mattermost team, channel and user names to IDs (and back).
+
+    Each entry is one listing fetched from the server (e.g. the channels of a user in a team), indexed
+    by every identifier of its items: `id`, `name` and `username`. Entries expire after `ttl` seconds
+    and are dropped explicitly by the operations which change them. At most `max_size` entries are kept,
+    the least recently used ones are dropped.
+
+    Entry keys are tuples whose first item is the kind of the listing:
+        ("teams", user_id): Teams the user belongs to.
+        ("channels", team_id, user_id): Channels the user belongs to within the team.
+        ("users",): Users of the server.
+
+    Args:
+        ttl (int): Number of seconds an entry stays valid.
+        max_size (int): Maximum number of entries kept.
+
+    Methods:
+        get: Returns the indexed listing stored under the key, or None if it is missing or expired.
+        items: Returns the items of the listing stored under the key in server order, or None.
+        put: Indexes the listing and stores it under the key.
+        invalidate: Drops all the entries whose keys start with the given prefix.
+        clear: Drops all the entries.
+    """
+
+    def __init__(self, ttl=settings.MATTERMOST_CACHE["index_ttl"], max_size=settings.MATTERMOST_CACHE["index_max_size"]):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # {key: (expires_at, [item, ...], {identifier: item, ...}), ...}, least recently used first.
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the indexed listing stored under the key, or None if it is missing or expired.
+        """
+        entry = self._get(key)
+        return entry[2] if entry is not None else None
+
+    def items(self, key):
+        """
+        Returns the items of the listing stored under the key in server order, or None if it is missing or expired.
+        """
+        entry = self._get(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key, items):
+        """
+        Indexes the listing by the `id`, `name` and `username` of its items and stores it under the key.
+        """
+        items = list(items)
+        indexed = {}
+        for item in items:
+            for field in ("id", "name", "username"):
+                if item.get(field) is not None:
+                    indexed.setdefault(item[field], item)
+
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, items, indexed)
+            self._entries.move_to_end(key)
+            _evict(self._entries, now, self.max_size)
+        return indexed
+
+    def invalidate(self, *prefix):
+        """
+        Drops all the entries whose keys start with the given prefix, e.g. `invalidate("channels", team_id)`.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[: len(prefix)] == prefix]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drops all the entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key):
+        """
+        Returns the unexpired entry stored under the key, marking it as recently used, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+
+class MattermostUserProfileCache:
+    """
+    An in-process cache of Mattermost usernames indexed by user ID.
+
+    Formatting a page of posts needs the username of every author. The cache lets the proxy resolve
+    all the authors of a page with at most one `users/ids` request for the ones not seen recently.
+    At most `max_size` usernames are kept, the least recently used ones are dropped.
+
+    Args:
+        ttl (int): Number of seconds a cached username stays valid.
+        max_size (int): Maximum number of usernames kept.
+
+    Methods:
+        get_many: Splits the given user IDs into cached usernames and IDs which must be fetched.
+        put_many: Caches the usernames of the given user profiles.
+        clear: Drops all the cached usernames.
+    """
+
+    def __init__(self, ttl=settings.MATTERMOST_CACHE["user_profile_ttl"], max_size=settings.MATTERMOST_CACHE["user_profile_max_size"]):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._usernames = OrderedDict()  # {user_id: (expires_at, username), ...}, least recently used first.
+        self._lock = threading.Lock()
+
+    def get_many(self, user_ids):
+        """
+        Splits the given user IDs into a dict of cached usernames and a list of IDs which must be fetched.
+        """
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in set(user_ids):
+                entry = self._usernames.get(user_id)
+                if entry is None or entry[0] < now:
+                    missing.append(user_id)
+                else:
+                    self._usernames.move_to_end(user_id)
+                    found[user_id] = entry[1]
+        return found, missing
+
+    def put_many(self, profiles):
+        """
+        Caches the usernames of the given user profiles.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for profile in profiles:
+                self._usernames[profile["id"]] = (now + self.ttl, profile["username"])
+                self._usernames.move_to_end(profile["id"])
+            _evict(self._usernames, now, self.max_size)
+
+    def clear(self):
+        """
+        Drops all the cached usernames.
+        """
+        with self._lock:
+            self._usernames.clear()
+
+
+def _evict(entries, now, max_size):
+    """
+    Drops the expired entries from the least recently used end of the entries, then the least recently used
+    entries beyond `max_size`. The expiration time must be the first item of the entries. Must be called under the lock.
+    """
+    while entries and next(iter(entries.values()))[0] < now:
+        entries.popitem(last=False)
+    while len(entries) > max_size:
+        entries.popitem(last=False)
+
+
+identifier_index = MattermostIdentifierIndex()
+user_profile_cache = MattermostUserProfileCache()
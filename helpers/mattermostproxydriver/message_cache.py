@@ -0,0 +1,364 @@
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _message_timestamp(message):
+    """
+    Returns the creation time of a formatted message in milliseconds, whether `create_at` was converted to ISO format or not.
+    """
+    create_at = message["create_at"]
+    if isinstance(create_at, str):
+        return datetime.fromisoformat(create_at).timestamp() * 1000
+    return create_at
+
+
+def _first_page(newest_messages, has_previous, page_size):
+    """
+    Makes the first page of messages (oldest first) out of the cached messages (newest first, up to `page_size + 1`
+    of them), or returns None when they do not fill the page while the channel has older messages.
+    """
+    if len(newest_messages) < page_size and has_previous:
+        return None
+    return newest_messages[:page_size][::-1], has_previous or len(newest_messages) > page_size
+
+
+class RecentMessageCache:
+    """
+    An in-process cache of the last messages of each channel, answering the first page of messages without a request.
+
+    The messages of a channel are stored when the first page is fetched from the server ("seeded") and the
+    messages posted afterwards are added as they are sent or received from the event stream, keeping the last
+    `max_messages` of them. Since posts made by other processes may be missed, a channel is seeded again
+    `ttl` seconds after it was seeded. Messages added to a channel which is not seeded are kept until it is,
+    so a message posted while the first page is being fetched is not lost. Edited or deleted messages
+    invalidate the whole channel.
+
+    The async methods (`aget`, `aseed`, ...) are the counterparts of the sync methods for the event loop.
+
+    Args:
+        max_messages (int): Number of messages kept for each channel.
+        max_channels (int): Number of channels kept, the least recently used ones are dropped.
+        ttl (int): Number of seconds the messages of a seeded channel stay valid.
+
+    Methods:
+        get: Returns the first page of messages of the channel and whether it has older messages, or None.
+        seed: Stores the first page of messages fetched from the server.
+        add: Adds a message posted to the channel.
+        invalidate: Drops the messages of the channel.
+        clear: Drops the messages of all the channels.
+    """
+
+    def __init__(
+        self,
+        max_messages=settings.CHAT_MESSAGE_CACHE["max_messages"],
+        max_channels=settings.CHAT_MESSAGE_CACHE["max_channels"],
+        ttl=settings.CHAT_MESSAGE_CACHE["ttl"],
+    ):
+        self.max_messages = max_messages
+        self.max_channels = max_channels
+        self.ttl = ttl
+        # {channel_id: [expires_at, has_previous, {message_id: message, ...}], ...}, `has_previous` is None until seeded.
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, channel_id, page_size):
+        """
+        Returns the first page of messages of the channel (oldest first) and whether the channel has older messages,
+        or None if the channel is not seeded, is expired or has not enough messages cached.
+        """
+        with self._lock:
+            entry = self._channels.get(channel_id)
+            if entry is None or entry[1] is None or entry[0] < time.monotonic():
+                return None
+            self._channels.move_to_end(channel_id)
+            newest_messages = sorted(entry[2].values(), key=_message_timestamp, reverse=True)[: page_size + 1]
+            return _first_page(newest_messages, entry[1], page_size)
+
+    def seed(self, channel_id, messages, has_previous):
+        """
+        Stores the first page of messages fetched from the server, along with whether the channel has older messages.
+        """
+        with self._lock:
+            entry = self._channels.get(channel_id)
+            if entry is None or entry[0] < time.monotonic():
+                entry = [0, None, {}]
+            entry[0], entry[1] = time.monotonic() + self.ttl, has_previous
+            self._add(channel_id, entry, messages)
+
+    def add(self, channel_id, message):
+        """
+        Adds a message posted to the channel, replacing the cached message with the same ID.
+        Like with the Redis backend, a seeded channel keeps its expiration time and a channel which was not seeded yet gets a new one.
+        """
+        with self._lock:
+            entry = self._channels.get(channel_id)
+            if entry is None or entry[0] < time.monotonic():
+                entry = [0, None, {}]
+            if entry[1] is None:
+                entry[0] = time.monotonic() + self.ttl
+            self._add(channel_id, entry, [message])
+
+    def invalidate(self, channel_id):
+        """
+        Drops the messages of the channel.
+        """
+        with self._lock:
+            self._channels.pop(channel_id, None)
+
+    def clear(self):
+        """
+        Drops the messages of all the channels.
+        """
+        with self._lock:
+            self._channels.clear()
+
+    async def aget(self, channel_id, page_size):
+        return self.get(channel_id, page_size)
+
+    async def aseed(self, channel_id, messages, has_previous):
+        self.seed(channel_id, messages, has_previous)
+
+    async def aadd(self, channel_id, message):
+        self.add(channel_id, message)
+
+    async def ainvalidate(self, channel_id):
+        self.invalidate(channel_id)
+
+    async def aclear(self):
+        self.clear()
+
+    def _add(self, channel_id, entry, messages):
+        """
+        Adds the messages to the entry of the channel, dropping the oldest ones beyond `max_messages`. Must be called with the lock held.
+        """
+        entry[2].update((message["id"], message) for message in messages)
+        if len(entry[2]) > self.max_messages:
+            kept = sorted(entry[2].values(), key=_message_timestamp)[-self.max_messages :]
+            entry[2] = {message["id"]: message for message in kept}
+            if entry[1] is not None:
+                entry[1] = True
+
+        self._channels[channel_id] = entry
+        self._channels.move_to_end(channel_id)
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+
+
+def _ignore_redis_errors(method):
+    """
+    Makes a (sync or async) cache method log Redis errors and return None instead of raising them:
+    an unavailable cache turns into cache misses, it must not fail the requests.
+    """
+    if asyncio.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await method(*args, **kwargs)
+            except redis.RedisError as e:
+                logger.warning("Chat message cache %s failed: %r.", method.__name__, e)
+                return None
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except redis.RedisError as e:
+            logger.warning("Chat message cache %s failed: %r.", method.__name__, e)
+            return None
+
+    return wrapper
+
+
+class RedisRecentMessageCache(RecentMessageCache):
+    """
+    A RecentMessageCache stored in Redis, shared by all the processes (including the `ingest_mattermost_events` worker).
+
+    Each channel has three keys: a sorted set of the message IDs scored by their creation time, a hash of the
+    messages indexed by ID and a flag telling whether the channel has older messages, which exists only once
+    the channel is seeded. All the updates run as Lua scripts, so concurrent processes never see a partial update.
+    Redis evicts the keys itself, so `max_channels` is not used.
+
+    Args:
+        url (str): URL of the Redis database.
+        prefix (str): Prefix of the keys.
+        max_messages (int): Number of messages kept for each channel.
+        ttl (int): Number of seconds the messages of a seeded channel stay valid.
+    """
+
+    # KEYS: order, messages, has_previous. ARGV: page_size.
+    GET_SCRIPT = """
+        local has_previous = redis.call("GET", KEYS[3])
+        if not has_previous then
+            return false
+        end
+        local ids = redis.call("ZREVRANGE", KEYS[1], 0, tonumber(ARGV[1]))
+        if #ids == 0 then
+            return {has_previous}
+        end
+        return {has_previous, unpack(redis.call("HMGET", KEYS[2], unpack(ids)))}
+    """
+
+    # KEYS: order, messages, has_previous. ARGV: max_messages, ttl, has_previous ("0" or "1" to seed, "" to add), then
+    # the timestamp, ID and JSON of each message.
+    ADD_SCRIPT = """
+        local max_messages, ttl, has_previous = tonumber(ARGV[1]), ARGV[2], ARGV[3]
+        for i = 4, #ARGV, 3 do
+            redis.call("ZADD", KEYS[1], ARGV[i], ARGV[i + 1])
+            redis.call("HSET", KEYS[2], ARGV[i + 1], ARGV[i + 2])
+        end
+        local seeded = redis.call("EXISTS", KEYS[3]) == 1
+        local trimmed = redis.call("ZRANGE", KEYS[1], 0, -max_messages - 1)
+        if #trimmed > 0 then
+            redis.call("ZREMRANGEBYRANK", KEYS[1], 0, -max_messages - 1)
+            redis.call("HDEL", KEYS[2], unpack(trimmed))
+            if has_previous ~= "" then
+                has_previous = "1"
+            elseif seeded then
+                redis.call("SET", KEYS[3], "1", "KEEPTTL")
+            end
+        end
+        if has_previous ~= "" then
+            redis.call("SET", KEYS[3], has_previous, "EX", ttl)
+        end
+        if has_previous ~= "" or not seeded then
+            redis.call("EXPIRE", KEYS[1], ttl)
+            redis.call("EXPIRE", KEYS[2], ttl)
+        end
+    """
+
+    def __init__(
+        self,
+        url=settings.CHAT_MESSAGE_CACHE["redis_url"],
+        prefix="chat-messages",
+        max_messages=settings.CHAT_MESSAGE_CACHE["max_messages"],
+        ttl=settings.CHAT_MESSAGE_CACHE["ttl"],
+    ):
+        super().__init__(max_messages=max_messages, ttl=ttl)
+        self.url = url
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._get_script = self._redis.register_script(self.GET_SCRIPT)
+        self._add_script = self._redis.register_script(self.ADD_SCRIPT)
+        # redis.asyncio clients are bound to the event loop they were created in.
+        self._async_redis_by_loop = weakref.WeakKeyDictionary()  # {event_loop: (client, get_script, add_script), ...}
+
+    @_ignore_redis_errors
+    def get(self, channel_id, page_size):
+        return self._parse_page(self._get_script(keys=self._keys(channel_id), args=[page_size]), page_size)
+
+    @_ignore_redis_errors
+    def seed(self, channel_id, messages, has_previous):
+        self._add_script(keys=self._keys(channel_id), args=self._add_args(messages, "1" if has_previous else "0"))
+
+    @_ignore_redis_errors
+    def add(self, channel_id, message):
+        self._add_script(keys=self._keys(channel_id), args=self._add_args([message], ""))
+
+    @_ignore_redis_errors
+    def invalidate(self, channel_id):
+        self._redis.delete(*self._keys(channel_id))
+
+    @_ignore_redis_errors
+    def clear(self):
+        for keys in self._batched(self._redis.scan_iter(match=f"{self.prefix}:*", count=1000)):
+            self._redis.delete(*keys)
+
+    @_ignore_redis_errors
+    async def aget(self, channel_id, page_size):
+        _, get_script, _ = self._async_redis()
+        return self._parse_page(await get_script(keys=self._keys(channel_id), args=[page_size]), page_size)
+
+    @_ignore_redis_errors
+    async def aseed(self, channel_id, messages, has_previous):
+        _, _, add_script = self._async_redis()
+        await add_script(keys=self._keys(channel_id), args=self._add_args(messages, "1" if has_previous else "0"))
+
+    @_ignore_redis_errors
+    async def aadd(self, channel_id, message):
+        _, _, add_script = self._async_redis()
+        await add_script(keys=self._keys(channel_id), args=self._add_args([message], ""))
+
+    @_ignore_redis_errors
+    async def ainvalidate(self, channel_id):
+        client, _, _ = self._async_redis()
+        await client.delete(*self._keys(channel_id))
+
+    @_ignore_redis_errors
+    async def aclear(self):
+        client, _, _ = self._async_redis()
+        keys = [key async for key in client.scan_iter(match=f"{self.prefix}:*", count=1000)]
+        for batch in self._batched(keys):
+            await client.delete(*batch)
+
+    def _async_redis(self):
+        """
+        Returns the redis.asyncio client of the running event loop and its scripts, creating them on the first call.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_redis_by_loop:
+            client = redis.asyncio.Redis.from_url(self.url)
+            self._async_redis_by_loop[loop] = (client, client.register_script(self.GET_SCRIPT), client.register_script(self.ADD_SCRIPT))
+        return self._async_redis_by_loop[loop]
+
+    def _keys(self, channel_id):
+        return [f"{self.prefix}:{channel_id}:order", f"{self.prefix}:{channel_id}:messages", f"{self.prefix}:{channel_id}:has_previous"]
+
+    def _add_args(self, messages, has_previous):
+        args = [self.max_messages, self.ttl, has_previous]
+        for message in messages:
+            args += [_message_timestamp(message), message["id"], json.dumps(message)]
+        return args
+
+    @staticmethod
+    def _parse_page(result, page_size):
+        """
+        Makes the first page of messages out of the result of the GET script.
+        """
+        if result is None:
+            return None
+        # A message may be missing from the hash while its ID is being trimmed by another process.
+        newest_messages = [json.loads(message) for message in result[1:] if message is not None]
+        return _first_page(newest_messages, result[0] == b"1", page_size)
+
+    @staticmethod
+    def _batched(keys, size=1000):
+        batch = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def create_recent_message_cache(backend=settings.CHAT_MESSAGE_CACHE["backend"]):
+    """
+    Creates the recent message cache of the configured backend: "memory", "redis", or None when the cache is disabled.
+    """
+    if not backend:
+        return None
+    if backend == "memory":
+        return RecentMessageCache()
+    if backend == "redis":
+        return RedisRecentMessageCache()
+    raise Exception(f"Unknown chat message cache backend: {backend}.")
+
+
+recent_message_cache = create_recent_message_cache()
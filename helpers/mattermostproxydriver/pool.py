@@ -0,0 +1,253 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from django.conf import settings
+from mattermostdriver import Driver
+from mattermostdriver.client import Client
+from mattermostdriver.exceptions import ContentTooLarge
+from mattermostdriver.exceptions import FeatureDisabled
+from mattermostdriver.exceptions import InvalidOrMissingParameters
+from mattermostdriver.exceptions import MethodNotAllowed
+from mattermostdriver.exceptions import NoAccessTokenProvided
+from mattermostdriver.exceptions import NotEnoughPermissions
+from mattermostdriver.exceptions import ResourceNotFound
+from requests.adapters import HTTPAdapter
+
+# Mattermost API errors raised by the driver, indexed by HTTP status code.
+ERRORS_BY_STATUS_CODE = {
+    400: InvalidOrMissingParameters,
+    401: NoAccessTokenProvided,
+    403: NotEnoughPermissions,
+    404: ResourceNotFound,
+    405: MethodNotAllowed,
+    413: ContentTooLarge,
+    501: FeatureDisabled,
+}
+
+LOGIN_ENDPOINT = "/users/login"
+
+
+class SessionClient(Client):
+    """
+    A Mattermost driver client which keeps its HTTP connections alive and re-logs in on token expiry.
+
+    The stock client sends every request through module level `requests` functions, so each API call
+    opens a new TCP/TLS connection. This client routes requests through one `requests.Session` instead.
+    When the server answers 401 (expired or revoked token), the `relogin` callable is invoked once and
+    the request is retried with the new token.
+
+    Attributes:
+        session (requests.Session): The HTTP session shared by all requests of the client.
+        relogin (callable): Callable which logs the driver in again. Usually `Driver.login`.
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.session = requests.Session()
+        self.relogin = None
+        self._login_lock = threading.Lock()
+
+    def make_request(self, method, endpoint, options=None, params=None, data=None, files=None, basepath=None):
+        """
+        Sends a request through the shared session, logging in again and retrying once on a 401 response.
+        """
+        token = self.token
+        try:
+            return self._send(method, endpoint, options=options, params=params, data=data, files=files, basepath=basepath)
+        except NoAccessTokenProvided:
+            if self.relogin is None or endpoint == LOGIN_ENDPOINT:
+                raise
+
+            with self._login_lock:
+                # Another thread may have already refreshed the token.
+                if self.token == token:
+                    self.relogin()
+
+            return self._send(method, endpoint, options=options, params=params, data=data, files=files, basepath=basepath)
+
+    def _send(self, method, endpoint, options=None, params=None, data=None, files=None, basepath=None):
+        """
+        Performs a single HTTP request and maps error responses to the driver exceptions.
+        """
+        if basepath:
+            url = f"{self._scheme}://{self._options['url']}:{self._port}{basepath}"
+        else:
+            url = self.url
+
+        request_params = {
+            "headers": self.auth_header(),
+            "verify": self._verify,
+            "json": options or {},
+            "params": params or {},
+            "data": data or {},
+            "files": files,
+            "timeout": self.request_timeout,
+        }
+        if self._auth is not None:
+            request_params["auth"] = self._auth()
+
+        response = self.session.request(method.lower(), url + endpoint, **request_params)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            try:
+                body = e.response.json()
+                message = body.get("message", body)
+            except ValueError:
+                message = response.text
+
+            exception_class = ERRORS_BY_STATUS_CODE.get(e.response.status_code)
+            if exception_class is None:
+                raise
+            raise exception_class(message) from None
+
+        return response
+
+
+def create_driver(login_id, password, base_url, pool_maxsize=None, scheme=settings.MATTERMOST_SERVER["scheme"], port=settings.MATTERMOST_SERVER["port"]):
+    """
+    Creates a logged in Mattermost driver which keeps its connections alive.
+    If `pool_maxsize` is given, the driver never opens more than that many connections at once;
+    extra concurrent requests wait for a free connection.
+    """
+    driver = Driver(
+        {"url": base_url, "login_id": login_id, "password": password, "scheme": scheme, "port": port, "basepath": "/api/v4", "verify": True},
+        client_cls=SessionClient,
+    )
+    driver.client.relogin = driver.login
+    if pool_maxsize is not None:
+        driver.client.session.mount(f"{scheme}://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True))
+    driver.login()
+    return driver
+
+
+class MattermostSessionPool:
+    """
+    A process-wide pool of authenticated Mattermost drivers.
+
+    Drivers are keyed by server URL and login ID, so consecutive requests of the same user reuse the
+    same token and the same keep-alive connections instead of logging in again. Concurrent requests of a
+    user missing from the pool share a single login. Sessions idle for
+    longer than `idle_timeout` seconds are evicted, and the least recently used session is dropped
+    when the pool grows over `max_size`. A session is replaced when the user's password changes. The
+    connections of the sessions dropped from the pool are closed `close_grace_period` seconds later, so the
+    requests of the threads still using them can complete.
+
+    Args:
+        max_size (int): Maximum number of sessions kept in the pool.
+        idle_timeout (int): Number of seconds after which an unused session is evicted.
+        close_grace_period (int): Number of seconds after which the connections of a dropped session are closed.
+
+    Methods:
+        get: Returns a logged in driver for the given credentials, logging in only on a pool miss.
+        discard: Removes the session of the given login ID from the pool.
+        clear: Removes all the sessions from the pool.
+    """
+
+    def __init__(
+        self,
+        max_size=settings.MATTERMOST_SESSION_POOL["max_size"],
+        idle_timeout=settings.MATTERMOST_SESSION_POOL["idle_timeout"],
+        close_grace_period=settings.MATTERMOST_SESSION_POOL["close_grace_period"],
+    ):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.close_grace_period = close_grace_period
+        self._sessions = OrderedDict()  # {(base_url, login_id): (driver, password, last_used), ...}
+        self._logins = {}  # {(base_url, login_id): (future, password), ...} of the logins in progress.
+        self._lock = threading.Lock()
+
+    def get(self, login_id, password, base_url=settings.MATTERMOST_SERVER["server_URL"]):
+        """
+        Returns a logged in driver for the given credentials, logging in only on a pool miss.
+        """
+        key = (base_url, login_id)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(key)
+            if session is not None and session[1] == password:
+                self._sessions[key] = (session[0], password, now)
+                self._sessions.move_to_end(key)
+                return session[0]
+
+            login = self._logins.get(key)
+            joins_login = login is not None and login[1] == password
+            if not joins_login:
+                login = (Future(), password)
+                self._logins[key] = login
+
+        if joins_login:
+            # Another thread is logging the same user in, its driver is shared.
+            return login[0].result()
+
+        # Log in outside the lock, so a slow login does not block other users.
+        try:
+            driver = create_driver(login_id=login_id, password=password, base_url=base_url)
+        except BaseException as e:
+            with self._lock:
+                if self._logins.get(key) is login:
+                    del self._logins[key]
+            login[0].set_exception(e)
+            raise
+
+        with self._lock:
+            if self._logins.get(key) is login:
+                del self._logins[key]
+            session = self._sessions.get(key)
+            if session is not None:
+                self._close(session[0])
+            self._sessions[key] = (driver, password, time.monotonic())
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                _, (evicted_driver, _, _) = self._sessions.popitem(last=False)
+                self._close(evicted_driver)
+
+        login[0].set_result(driver)
+        return driver
+
+    def discard(self, login_id, base_url=settings.MATTERMOST_SERVER["server_URL"]):
+        """
+        Removes the session of the given login ID from the pool.
+        """
+        with self._lock:
+            session = self._sessions.pop((base_url, login_id), None)
+            if session is not None:
+                self._close(session[0])
+
+    def clear(self):
+        """
+        Removes all the sessions from the pool.
+        """
+        with self._lock:
+            for driver, _, _ in self._sessions.values():
+                self._close(driver)
+            self._sessions.clear()
+
+    def _evict_idle(self, now):
+        """
+        Drops and closes sessions which have not been used for `idle_timeout` seconds. Must be called under the lock.
+        """
+        # Sessions are ordered by the last use, so the idle ones are at the beginning.
+        while self._sessions:
+            key, (driver, _, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._sessions.pop(key)
+            self._close(driver)
+
+    def _close(self, driver):
+        """
+        Closes the connections of the driver of a dropped session after `close_grace_period` seconds,
+        so the requests of the threads which have just received the driver from `get` can still complete.
+        """
+        timer = threading.Timer(self.close_grace_period, driver.client.session.close)
+        timer.daemon = True
+        timer.start()
+
+
+session_pool = MattermostSessionPool()
@@ -1,8 +1,13 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-import pytz
 from django.conf import settings
-from mattermostdriver import Driver
+
+from helpers.mattermostproxydriver import common
+from helpers.mattermostproxydriver.index import identifier_index
+from helpers.mattermostproxydriver.index import user_profile_cache
+from helpers.mattermostproxydriver.message_cache import recent_message_cache
+from helpers.mattermostproxydriver.pool import create_driver
+from helpers.mattermostproxydriver.pool import session_pool
 
 
 class MattermostUserProxy:
@@ -11,14 +16,17 @@ class MattermostUserProxy:
 
     This class provides methods for various operations on a Mattermost server,
     such as listing users, teams, channels, joining channels, sending messages, and more.
-    It uses the Mattermost Driver to communicate with the Mattermost API.
+    It uses the Mattermost Driver to communicate with the Mattermost API, the logic it shares with
+    AsyncMattermostUserProxy lives in `helpers.mattermostproxydriver.common`.
 
     Args:
         base_url (str): Base URL of the Mattermost server.
         login_id (str): Login ID for authenticating with the Mattermost server.
         password (str): Password for authenticating with the Mattermost server.
+        driver (Driver): An already logged in driver to use instead of logging in again.
 
     Methods:
+        from_user: Creates a proxy for a Django user, reusing the user's pooled session.
         list_users: Lists all users from the Mattermost server.
         list_related_teams: Lists teams related to the authenticated user.
         list_related_channels: Lists channels related to a specific team, with an option to filter by the authenticated user.
@@ -28,136 +36,155 @@ class MattermostUserProxy:
         get_messages: Retrieves messages from a specified channel, optionally converting timestamps to a given timezone.
     """
 
+    convert_timestamp_to_iso = staticmethod(common.convert_timestamp_to_iso)
+
     def __init__(
         self,
         login_id=settings.MATTERMOST_SERVER["admin_login_id"],
         password=settings.MATTERMOST_SERVER["admin_password"],
         base_url=settings.MATTERMOST_SERVER["server_URL"],
+        driver=None,
     ):
         """
         Initializes the MattermostUserProxy instance with server details and admin token.
         """
         self.base_url = base_url
-        self.driver = Driver({"url": base_url, "login_id": login_id, "password": password, "scheme": "https", "port": 443, "basepath": "/api/v4", "verify": True})
-        self.driver.login()
+        self.driver = driver if driver is not None else create_driver(login_id=login_id, password=password, base_url=base_url)
         self.headers = {"Authorization": f"Bearer {self.driver.client.token}", "Content-Type": "application/json"}
         self.username = self.driver.client.username
         self.userid = self.driver.client.userid
 
-    def _find_by_id_or_name(self, collection, identifier, find_name=False):
+    @classmethod
+    def from_user(cls, user, base_url=settings.MATTERMOST_SERVER["server_URL"]):
+        """
+        Creates a proxy for a Django user, reusing the user's pooled session instead of logging in again.
+        """
+        login_id, password = user.username, user.password[:30]
+        driver = session_pool.get(login_id=login_id, password=password, base_url=base_url)
+        return cls(login_id=login_id, password=password, base_url=base_url, driver=driver)
+
+    def _find_item(self, key, fetch, identifier):
         """
-        Searches for an item by ID or name in a given collection.
+        Searches for an item by ID or name in the cached listing stored under the key.
+        The listing is fetched from the server when it is not cached or does not contain the identifier.
         """
-        for item in collection:
-            if item.get("id") == identifier or item.get("name") == identifier or item.get("username") == identifier:
-                if find_name:
-                    return item.get("username") if "username" in item else item.get("id")
-                else:
-                    return item.get("id") if "id" in item else item.get("username")
-        return None
+        item = common.find_indexed(key, identifier)
+        if item is None:
+            # The identifier may have been created after the listing was cached.
+            item = common.index_and_find(key, fetch(), identifier)
+        return item
+
+    def _find_by_id_or_name(self, key, fetch, identifier, find_name=False):
+        """
+        Searches for the ID (or the name) of an item by ID or name in the cached listing stored under the key.
+        """
+        return common.identifier_of(self._find_item(key, fetch, identifier), find_name)
 
     def _find_user_id_or_name(self, identifier, find_name=False):
         """
         Finds a user ID based on a provided identifier (ID or username).
         """
-        if find_name:
-            return self._find_by_id_or_name(self.driver.users.get_users(), identifier, find_name=True)
-        else:
-            return self._find_by_id_or_name(self.driver.users.get_users(), identifier)
+        return self._find_by_id_or_name(("users",), self.driver.users.get_users, identifier, find_name=find_name)
+
+    def _find_usernames(self, user_ids):
+        """
+        Resolves the usernames of the given user IDs, fetching the ones not cached yet with a single request.
+        """
+        usernames, missing = user_profile_cache.get_many(user_ids)
+        if missing:
+            usernames = common.cache_usernames(usernames, self.driver.users.get_users_by_ids(options=missing))
+        return usernames
+
+    def _find_channel(self, team_id, identifier):
+        """
+        Finds a channel the authenticated user belongs to within a specified team based on the channel identifier, or None.
+        """
+        return self._find_item(("channels", team_id, self.userid), lambda: self._fetch_channels(team_id), identifier)
 
     def _find_channel_id(self, team_id, identifier):
         """
         Finds a channel ID within a specified team based on the channel identifier.
         """
-        return self._find_by_id_or_name(self.driver.channels.get_channels_for_user(user_id=self.userid, team_id=team_id), identifier)
+        return common.identifier_of(self._find_channel(team_id, identifier))
 
     def _find_team_id(self, identifier):
         """
         Finds a team ID based on a provided team identifier (ID or team name).
         """
-        return self._find_by_id_or_name(self.driver.teams.get_user_teams(self.userid), identifier)
+        return self._find_by_id_or_name(("teams", self.userid), lambda: self.driver.teams.get_user_teams(self.userid), identifier)
+
+    def _fetch_channels(self, team_id):
+        """
+        Fetches the channels the authenticated user belongs to within a specified team.
+        """
+        return self.driver.channels.get_channels_for_user(user_id=self.userid, team_id=team_id)
+
+    def _list_channels(self, team_id):
+        """
+        Lists the channels the authenticated user belongs to within a specified team, using the cached listing if any.
+        """
+        channels = identifier_index.items(("channels", team_id, self.userid))
+        if channels is None:
+            channels = self._fetch_channels(team_id)
+            identifier_index.put(("channels", team_id, self.userid), channels)
+        return channels
 
-    @staticmethod
-    def convert_timestamp_to_iso(timestamp, tz_name):
+    def _format_posts(self, posts, time_zone=settings.TIME_ZONE, known_usernames=None):
         """
-        Converts a timestamp to ISO format in a specified timezone.
+        Formats posts returned by the Mattermost server, resolving the usernames of all their authors at once.
+        Usernames of `known_usernames` (indexed by user ID) are not resolved again.
         """
-        utc_time = datetime.utcfromtimestamp(timestamp / 1000).replace(tzinfo=pytz.utc)
-        target_time = utc_time.astimezone(pytz.timezone(tz_name))
-        return target_time.isoformat()
+        known_usernames = known_usernames or {}
+        usernames = {**known_usernames, **self._find_usernames(common.post_authors(posts, known_usernames))}
+        return common.format_posts(posts, usernames, time_zone)
+
+    def _get_last_messages(self, channels, time_zone=settings.TIME_ZONE):
+        """
+        Fetches the last message of each given channel concurrently, with a bounded number of requests in flight.
+        Channels without any post (according to their `last_post_at`) are not requested at all.
+        Returns a dict of formatted messages indexed by channel ID.
+        """
+        channel_ids = common.channels_with_posts(channels)
+        if not channel_ids:
+            return {}
+
+        def fetch_last_post(channel_id):
+            return common.last_post(self.driver.posts.get_posts_for_channel(channel_id, params={"page": 0, "per_page": 1}))
+
+        with ThreadPoolExecutor(max_workers=min(len(channel_ids), settings.MATTERMOST_SESSION_POOL["max_parallel_requests"])) as executor:
+            last_posts = [post for post in executor.map(fetch_last_post, channel_ids) if post is not None]
+
+        return {post["channel_id"]: message for post, message in zip(last_posts, self._format_posts(last_posts, time_zone))}
 
     def list_users(self):
         """
         Lists all users from the Mattermost server.
         """
-        users = self.driver.users.get_users()
-        return [{"name": user["username"], "id": user["id"]} for user in users]
+        return common.format_users(self.driver.users.get_users())
 
     def list_related_teams(self):
         """
         Lists teams related to the authenticated user.
         """
-        teams = self.driver.teams.get_user_teams(user_id=self.userid)
-        return [{"name": team["name"], "id": team["id"]} for team in teams]
+        return common.format_teams(self.driver.teams.get_user_teams(user_id=self.userid))
 
     def list_related_channels(self, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exclude_list=None, params=None, exception=True):
         """
         Lists channels related to a specific team, excluding those that contain any of the specified strings in the list,
         with pagination. Each channel's data includes the last message of the channel.
         """
-        if exclude_list is None:
-            exclude_list = []
-
         team_id = self._find_team_id(team_identifier)
         if team_id is None:
             if exception:
                 raise Exception("Team identifier not found.")
             return False
 
-        channels = self.driver.channels.get_channels_for_user(user_id=self.userid, team_id=team_id)
-
-        # Converting all strings in the exclude list to lowercase for case-insensitive comparison
-        exclude_list = [str.lower() for str in exclude_list]
-
-        # Fetching channels and their last messages
-        filtered_channels = []
-        for channel in channels:
-            if channel["display_name"] and not any(exclude_str in channel["name"].lower() for exclude_str in exclude_list):
-                # Fetch the messages of the channel and get the last one
-                # This is a placeholder - replace with actual method to fetch messages and then get the last message
-                last_message, _, _ = self.get_messages(team_identifier=team_identifier, channel_identifier=channel["name"], last_message=True)
-
-                filtered_channels.append(
-                    {
-                        "team_name": team_identifier,
-                        "name": channel["name"],
-                        "id": channel["id"],
-                        "last_message": last_message[0],  # Including the last message in the channel data
-                    }
-                )
+        paginated_channels, has_next = common.paginate_channels(self._list_channels(team_id), exclude_list, params)
 
-        # Pagination
-        has_next = False
-        if params.get("page", False) and params.get("per_page", False):
-            page_number = int(params.get("page"))
-            page_size = int(params.get("per_page"))
-            start_index = (page_number - 1) * page_size
-            end_index = start_index + page_size
+        # Fetching the last messages of the requested channels only
+        last_messages = self._get_last_messages(paginated_channels)
 
-            # Slicing the list for the requested page
-            paginated_channels = filtered_channels[start_index:end_index]
-
-            # Calculate total items and total pages
-            total_items = len(filtered_channels)
-            total_pages = -(-total_items // page_size)  # Ceiling division
-
-            # Determine if there is a next page
-            has_next = page_number < total_pages
-
-        else:
-            paginated_channels = filtered_channels
-
-        return paginated_channels, has_next
+        return common.format_channels(paginated_channels, team_identifier, last_messages), has_next
 
     def join_to_channel(self, channel_identifier, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], exception=True):
         """
@@ -173,6 +200,7 @@ class MattermostUserProxy:
                 raise Exception("Channel identifier not found.")
 
             response = self.driver.channels.add_user(channel_id, options={"user_id": self.userid})
+            identifier_index.invalidate("channels", team_id)
             return response is not None
         except Exception as e:
             if exception:
@@ -193,15 +221,18 @@ class MattermostUserProxy:
                 raise Exception("Channel identifier not found.")
 
             response = self.driver.channels.remove_channel_member(channel_id, self.userid)
+            identifier_index.invalidate("channels", team_id)
             return response["status"] == "OK"
         except Exception as e:
             if exception:
                 raise e
             return False
 
-    def send_message(self, channel_identifier, message, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], time_zone=settings.TIME_ZONE, exception=True):
+    def send_message(
+        self, channel_identifier, message, team_identifier=settings.MATTERMOST_SERVER["team_identifier"], time_zone=settings.TIME_ZONE, props=None, exception=True
+    ):
         """
-        Sends a message to a specified channel.
+        Sends a message to a specified channel, with the given custom post properties if any.
         """
         try:
             team_id = self._find_team_id(team_identifier)
@@ -212,17 +243,13 @@ class MattermostUserProxy:
             if channel_id is None:
                 raise Exception("Channel identifier not found.")
 
-            post = {"channel_id": channel_id, "message": message}
-            response = self.driver.posts.create_post(post)
+            response = self.driver.posts.create_post(common.make_post(channel_id, message, props))
 
-            formatted_response = {
-                "message": response["message"],
-                "create_at": self.convert_timestamp_to_iso(response["create_at"], time_zone) if time_zone else response["create_at"],
-                "user_id": response["user_id"],
-                "username": self._find_user_id_or_name(response["user_id"], find_name=True),
-                "id": response["id"],
-                "type": response["type"] if response["type"] else "str",
-            }
+            # The post is made by the authenticated user, so the username is already known.
+            formatted_response = self._format_posts([response], time_zone, known_usernames={self.userid: self.username})[0]
+
+            if common.caches_messages(time_zone):
+                recent_message_cache.add(channel_id, formatted_response)
 
             return formatted_response
         except Exception as e:
@@ -252,6 +279,13 @@ class MattermostUserProxy:
             if channel_id is None:
                 raise Exception("Channel identifier not found.")
 
+            # The first page of a channel whose last messages are cached is answered without a request.
+            page_size = common.cached_page_size(params, time_zone, last_message)
+            if page_size is not None:
+                cached_page = recent_message_cache.get(channel_id, page_size)
+                if cached_page is not None:
+                    return common.cached_messages_page(cached_page)
+
             if last_message:
                 # Fetch only the last message
                 messages = self.driver.posts.get_posts_for_channel(channel_id, params={"page": 0, "per_page": 1})
@@ -260,19 +294,12 @@ class MattermostUserProxy:
                 messages = self.driver.posts.get_posts_for_channel(channel_id, params=params)
 
             # Formatting messages
-            formatted_messages = [
-                {
-                    "message": msg["message"],
-                    "create_at": self.convert_timestamp_to_iso(msg["create_at"], time_zone) if time_zone else msg["create_at"],
-                    "user_id": msg["user_id"],
-                    "username": self._find_user_id_or_name(msg["user_id"], find_name=True),
-                    "id": msg["id"],
-                    "type": msg["type"] if msg["type"] else "str",
-                }
-                for msg in messages["posts"].values()
-            ]
-
-            return formatted_messages, bool(messages["prev_post_id"]), bool(messages["next_post_id"])
+            formatted_messages = self._format_posts(list(messages["posts"].values()), time_zone)
+
+            if page_size is not None:
+                recent_message_cache.seed(channel_id, formatted_messages, bool(messages["prev_post_id"]))
+
+            return common.messages_page(formatted_messages, messages)
         except Exception as e:
             if exception:
                 raise e
@@ -1,5 +1,6 @@
 from helpers.channels_graphql_ws import graphql_ws_consumer
 from mattermostsub.schema import schema
+from mattermostsub.views import document_cache
 
 
 class MyGraphqlWsConsumer(graphql_ws_consumer.GraphqlWsConsumer):
@@ -7,9 +8,15 @@ class MyGraphqlWsConsumer(graphql_ws_consumer.GraphqlWsConsumer):
 
     schema = schema
 
+    # Share parsed documents with the HTTP view.
+    document_cache = document_cache
+
     # send keepalive message every 42 seconds.
     # send_keepalive_every = 42
 
+    # Execute operations in a thread pool, since mutations make blocking calls to Mattermost.
+    execute_in_executor = True
+
     async def on_connect(self, payload):
         """New client connection handler."""
         print("New client connected!")
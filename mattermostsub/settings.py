@@ -161,4 +161,55 @@ MATTERMOST_SERVER = {
     "admin_login_id": os.getenv("MATTERMOST_ADMIN_LOGIN_ID"),
     "admin_password": os.getenv("MATTERMOST_ADMIN_LOGIN_PASSWORD"),
     "team_identifier": os.getenv("MATTERMOST_TEAM_IDENTIFIER"),
+    "scheme": os.getenv("MATTERMOST_SERVER_SCHEME", "https"),
+    "port": int(os.getenv("MATTERMOST_SERVER_PORT", 443)),
+}
+
+# Mattermost user sessions pool configuration
+MATTERMOST_SESSION_POOL = {
+    "max_size": int(os.getenv("MATTERMOST_SESSION_POOL_MAX_SIZE", 1000)),
+    "idle_timeout": int(os.getenv("MATTERMOST_SESSION_POOL_IDLE_TIMEOUT", 900)),
+    "admin_pool_maxsize": int(os.getenv("MATTERMOST_ADMIN_POOL_MAXSIZE", 10)),
+    "max_parallel_requests": int(os.getenv("MATTERMOST_MAX_PARALLEL_REQUESTS", 8)),
+    "close_grace_period": int(os.getenv("MATTERMOST_SESSION_POOL_CLOSE_GRACE_PERIOD", 60)),
+}
+
+# Mattermost in-process caches configuration
+MATTERMOST_CACHE = {
+    "index_ttl": int(os.getenv("MATTERMOST_INDEX_TTL", 300)),
+    "index_max_size": int(os.getenv("MATTERMOST_INDEX_MAX_SIZE", 10000)),
+    "user_profile_ttl": int(os.getenv("MATTERMOST_USER_PROFILE_TTL", 3600)),
+    "user_profile_max_size": int(os.getenv("MATTERMOST_USER_PROFILE_MAX_SIZE", 100000)),
+}
+
+# Mattermost WebSocket events stream (the `ingest_mattermost_events` management command)
+MATTERMOST_EVENTS = {
+    "reconnect_delay": float(os.getenv("MATTERMOST_EVENTS_RECONNECT_DELAY", 1)),
+    "max_reconnect_delay": float(os.getenv("MATTERMOST_EVENTS_MAX_RECONNECT_DELAY", 60)),
+    "heartbeat": float(os.getenv("MATTERMOST_EVENTS_HEARTBEAT", 30)),
+}
+
+# Last messages of each channel, answering the first page of getMessageList without a Mattermost request
+CHAT_MESSAGE_CACHE = {
+    # "memory" (per process), "redis" (shared by all the processes, required with the `ingest_mattermost_events` worker) or empty to disable the cache.
+    # With the memory backend, messages edited or deleted in Mattermost are only picked up when their channel expires after `ttl` seconds.
+    "backend": os.getenv("CHAT_MESSAGE_CACHE_BACKEND", ""),
+    "max_messages": int(os.getenv("CHAT_MESSAGE_CACHE_MAX_MESSAGES", 100)),
+    "max_channels": int(os.getenv("CHAT_MESSAGE_CACHE_MAX_CHANNELS", 1000)),
+    "ttl": int(os.getenv("CHAT_MESSAGE_CACHE_TTL", 300)),
+    "redis_url": os.getenv("CHAT_MESSAGE_CACHE_REDIS_URL", "redis://127.0.0.1:6379/1"),
+}
+
+# Process-wide cache of parsed and validated GraphQL documents
+GRAPHQL_DOCUMENT_CACHE = {
+    "max_size": int(os.getenv("GRAPHQL_DOCUMENT_CACHE_MAX_SIZE", 1024)),
+}
+
+# Notification of channel members about new chat messages
+CHAT_MESSAGE_BROADCAST = {
+    "executor_max_workers": int(os.getenv("CHAT_MESSAGE_BROADCAST_EXECUTOR_MAX_WORKERS", 4)),
+    # Also send the raw `chat_message` channel layer event, for clients not moved to the OnNewChatMessage subscription yet.
+    "legacy_chat_message_event": os.getenv("CHAT_MESSAGE_LEGACY_EVENT", "False").lower() in ("true", "1"),
+    # Broadcast a provisional copy of the message before posting it to Mattermost, followed by the confirmation.
+    "optimistic_echo": os.getenv("CHAT_MESSAGE_OPTIMISTIC_ECHO", "False").lower() in ("true", "1"),
 }
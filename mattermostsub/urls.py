@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 
-urlpatterns = [path("admin/", admin.site.urls), path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True)))]
+from mattermostsub.views import CachedGraphQLView
+
+urlpatterns = [path("admin/", admin.site.urls), path("graphql/", csrf_exempt(CachedGraphQLView.as_view(graphiql=True)))]
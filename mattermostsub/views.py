@@ -0,0 +1,106 @@
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.http import HttpResponseNotAllowed
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView
+from graphene_django.views import HttpError
+from graphql import ExecutionResult
+from graphql import OperationType
+from graphql import execute
+from graphql import validate_schema
+
+from helpers.channels_graphql_ws.document_cache import DocumentCache
+from helpers.channels_graphql_ws.document_cache import persisted_query_hash
+
+# Parsed and validated GraphQL documents shared by the HTTP view and the WebSocket consumer.
+document_cache = DocumentCache(max_size=settings.GRAPHQL_DOCUMENT_CACHE["max_size"])
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView which takes parsed and validated documents from the process-wide document cache,
+    so the same query is parsed and validated only once per process instead of once per request.
+
+    Also supports automatic persisted queries: a request may carry only the SHA-256 hash of a query
+    already known to the server in `extensions.persistedQuery.sha256Hash` instead of the query text.
+    """
+
+    document_cache = document_cache
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        Executes the GraphQL request like GraphQLView does, looking the parsed document up in the cache first.
+        """
+        query_hash = persisted_query_hash(self.get_extensions(request, data))
+        if not query and query_hash is None:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, operation_ast, errors = self.document_cache.parse(
+            schema, query or None, operation_name, validation_rules=self.validation_rules, max_errors=graphene_settings.MAX_VALIDATION_ERRORS, query_hash=query_hash
+        )
+
+        # The document could not be parsed
+        if document is None:
+            return ExecutionResult(errors=errors)
+
+        if request.method.lower() == "get" and operation_ast is not None and operation_ast.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None
+
+            raise HttpError(HttpResponseNotAllowed(["POST"], f"Can only perform a {operation_ast.operation.value} operation from a POST request."))
+
+        # The document is not valid
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (graphene_settings.ATOMIC_MUTATIONS is True or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True)
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    @staticmethod
+    def get_extensions(request, data):
+        """
+        Returns the extensions of the GraphQL request, which are JSON encoded in GET requests.
+        """
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except Exception:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions